@@ -0,0 +1,59 @@
+"""Compare N single-task requests against one batch request.
+
+Runs against a live backend, e.g.
+
+    python benchmarks/batch_vs_single.py --base-url http://localhost:5000 --todolist-id 1 --owner-id 1 -n 200
+
+Tasks created by the run are deleted again at the end.
+"""
+import argparse
+import json
+import time
+import urllib.request
+
+
+def call(base_url, method, path, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(base_url + path, data=data, method=method,
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req) as resp:
+        return json.loads(resp.read())
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:5000")
+    parser.add_argument("--todolist-id", type=int, required=True)
+    parser.add_argument("--owner-id", type=int, required=True)
+    parser.add_argument("-n", type=int, default=100)
+    args = parser.parse_args()
+
+    payloads = [{"description": f"bench task {i}", "todolist_id": args.todolist_id, "owner_id": args.owner_id}
+                for i in range(args.n)]
+    base = args.base_url.rstrip("/")
+
+    single_create, created = timed(lambda: [call(base, "POST", "/tasks", p)["task"]["id"] for p in payloads])
+    single_update, _ = timed(lambda: [call(base, "PUT", f"/tasks/{i}", {"progress": "Completed"}) for i in created])
+    single_delete, _ = timed(lambda: [call(base, "DELETE", f"/tasks/{i}") for i in created])
+
+    batch_create, result = timed(lambda: call(base, "POST", "/tasks/batch", payloads))
+    batch_ids = [r["task"]["id"] for r in result["results"]]
+    batch_update, _ = timed(lambda: call(base, "PATCH", "/tasks/batch",
+                                         [{"id": i, "progress": "Completed"} for i in batch_ids]))
+    batch_delete, _ = timed(lambda: call(base, "DELETE", "/tasks/batch", {"task_ids": batch_ids}))
+
+    print(f"{'operation':<10}{'single (s)':>12}{'batch (s)':>12}{'speedup':>10}   n={args.n}")
+    for name, single, batch in [("create", single_create, batch_create),
+                                ("update", single_update, batch_update),
+                                ("delete", single_delete, batch_delete)]:
+        print(f"{name:<10}{single:>12.3f}{batch:>12.3f}{single / batch:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
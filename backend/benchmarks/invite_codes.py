@@ -0,0 +1,109 @@
+"""Stress the invite-code service: collisions at scale and hot-code lookup latency.
+
+    python benchmarks/invite_codes.py                 # 2M codes at the configured length
+    python benchmarks/invite_codes.py --length 5 -n 100000
+
+Codes go through the real execute_with_invite_code retry loop against an
+in-memory stand-in for the unique index, so every collision exercises the
+same path a duplicate-key error from MySQL would. Lookups go through
+resolve_invite_code with the in-memory cache warm.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+import pymysql
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import invites  # noqa: E402
+
+
+class UniqueIndexCursor:
+    """Accepts INSERTs of codes and raises MySQL's duplicate-key error on a repeat."""
+
+    def __init__(self):
+        self.codes = {}
+        self.collisions = 0
+        self.db_lookups = 0
+        self._row = None
+
+    async def execute(self, sql, params):
+        if sql.startswith("INSERT"):
+            code = params[-1]
+            if code in self.codes:
+                self.collisions += 1
+                raise pymysql.err.IntegrityError(
+                    invites.MYSQL_DUPLICATE_ENTRY, f"Duplicate entry '{code}' for key 'ToDoList.uq_todolist_invite_code'")
+            self.codes[code] = len(self.codes) + 1
+        else:
+            self.db_lookups += 1
+            list_id = self.codes.get(params[0])
+            self._row = (list_id, None) if list_id else None
+
+    async def fetchone(self):
+        return self._row
+
+
+async def generate(cursor, n, length):
+    attempts = []
+    failures = 0
+
+    def counting_generate():
+        attempts[-1] += 1
+        return invites.generate_invite_code(length)
+
+    start = time.perf_counter()
+    for _ in range(n):
+        attempts.append(0)
+        try:
+            await invites.execute_with_invite_code(
+                cursor, "INSERT INTO ToDoList (InviteCode) VALUES (%s);", lambda code: (code,), counting_generate)
+        except pymysql.err.IntegrityError:
+            failures += 1
+    return time.perf_counter() - start, attempts, failures
+
+
+async def lookups(cursor, count):
+    codes = list(cursor.codes)
+    hot = random.sample(codes, min(len(codes), invites.INVITE_CACHE_SIZE))
+    for code in hot:
+        await invites.resolve_invite_code(cursor, code)  # warm the cache
+    cursor.db_lookups = 0
+
+    samples = []
+    for _ in range(count):
+        code = random.choice(hot)
+        start = time.perf_counter()
+        await invites.resolve_invite_code(cursor, code)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def main(args):
+    cursor = UniqueIndexCursor()
+    elapsed, attempts, failures = await generate(cursor, args.n, args.length)
+    space = len(invites.INVITE_CODE_ALPHABET) ** args.length
+    expected = args.n * (args.n - 1) / (2 * space)
+    print(f"generated {len(cursor.codes):,} unique codes of length {args.length} in {elapsed:.1f}s "
+          f"({args.n / elapsed:,.0f}/s)")
+    print(f"collisions retried: {cursor.collisions:,} (birthday estimate {expected:,.1f}), "
+          f"max attempts for one code: {max(attempts)}, gave up after {invites.INVITE_CODE_MAX_ATTEMPTS}: {failures}")
+
+    samples = await lookups(cursor, args.lookups)
+    quantiles = statistics.quantiles(samples, n=100)
+    print(f"{args.lookups:,} cached lookups: p50 {quantiles[49] * 1e6:.2f}us  p99 {quantiles[98] * 1e6:.2f}us  "
+          f"database fallbacks: {cursor.db_lookups}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=2_000_000, help="codes to generate")
+    parser.add_argument("--length", type=int, default=invites.INVITE_CODE_LENGTH)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,417 @@
+"""Seeded, repeatable load test for the backend API.
+
+Creates (or reuses) a scratch MySQL database, applies migrations, seeds it
+with synthetic users, lists, shares and tasks, starts the app with uvicorn
+against it, and replays workloads modeled on the mobile app's call
+patterns at each requested concurrency level:
+
+    pip install -r benchmarks/requirements.txt
+    MYSQL_HOST=127.0.0.1 MYSQL_ROOT_PASSWORD=... \\
+        python benchmarks/loadtest.py --concurrency 1 8 32 --duration 30 --output results/run.json
+
+Connection settings come from the same MYSQL_* variables as the app; the
+data goes into --database (default tododb_bench), never the app database.
+Pass --base-url to drive an already running server instead; it must be
+pointed at the same seeded database (DB_NAME=tododb_bench).
+
+Compare two saved runs:
+
+    python benchmarks/loadtest.py --compare results/before.json results/after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import string
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from db import Database, PoolConfig  # noqa: E402
+from migrate import migrate  # noqa: E402
+
+# Relative weights of each scripted flow in the mixed workload.
+DEFAULT_MIX = {
+    "focus": 60,          # HomeScreen/ListScreen focus: lists, then tasks and members of one list
+    "home": 0,            # the same screen from the single GET /home/{user_id}; opt in with --mix
+    "add_refetch": 15,    # addTaskToServer followed by fetchTasks
+    "toggle_refetch": 15, # updateTaskOnServer (progress) followed by fetchTasks
+    "join": 5,            # create a shared list, another user joins via invite code
+    "login": 5,
+}
+
+
+# ---------------------------------------------------------------- seeding
+
+async def seed(args):
+    config = PoolConfig()
+    config.database = None
+    config.minsize = 1
+    admin = Database(config)
+    await admin.connect()
+    async with admin.acquire() as connection:
+        async with connection.cursor() as cursor:
+            if args.reset:
+                await cursor.execute(f"DROP DATABASE IF EXISTS `{args.database}`;")
+            await cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{args.database}`;")
+    await admin.close()
+
+    config = PoolConfig()
+    config.database = args.database
+    config.minsize = 1
+    database = Database(config)
+    await database.connect()
+    try:
+        await migrate(database)
+        async with database.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute("SELECT COUNT(*) FROM User;")
+                if (await cursor.fetchone())[0] and not args.reset:
+                    print("Reusing existing seed data (pass --reset to reseed)")
+                else:
+                    await _insert_seed_data(cursor, args)
+                    await connection.commit()
+                return await _load_fixture(cursor)
+    finally:
+        await database.close()
+
+
+async def _insert_many(cursor, sql_prefix, rows, chunk=5000):
+    for i in range(0, len(rows), chunk):
+        part = rows[i:i + chunk]
+        placeholders = ", ".join(["(" + ", ".join(["%s"] * len(part[0])) + ")"] * len(part))
+        await cursor.execute(f"{sql_prefix} VALUES {placeholders};", tuple(v for row in part for v in row))
+
+
+async def _insert_seed_data(cursor, args):
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    await _insert_many(cursor, "INSERT INTO User (UserID, Username)",
+                       [(u, f"bench_user_{u}") for u in range(1, args.users + 1)])
+
+    lists = []
+    list_id = 0
+    for owner in range(1, args.users + 1):
+        for _ in range(args.lists_per_user):
+            list_id += 1
+            shared = rng.random() < args.shared_ratio
+            code = "".join(rng.choices(string.ascii_uppercase + string.digits, k=8)) + str(list_id) if shared else None
+            lists.append((list_id, int(shared), owner, f"List {list_id}", code))
+    await _insert_many(cursor, "INSERT INTO ToDoList (ToDoListID, SharedFlag, UserID, Name, InviteCode)", lists)
+
+    shares = set()
+    for lid, shared, owner, _, _ in lists:
+        if not shared:
+            continue
+        for member in rng.sample(range(1, args.users + 1), min(args.members_per_shared_list, args.users)):
+            if member != owner:
+                shares.add((lid, member))
+    if shares:
+        await _insert_many(cursor, "INSERT INTO ToDoListShare (ToDoListID, UserID)", sorted(shares))
+
+    today = date.today()
+    tasks = []
+    for lid, _, owner, _, _ in lists:
+        for n in range(args.tasks_per_list):
+            due = today + timedelta(days=rng.randint(-30, 60)) if rng.random() < 0.8 else None
+            tasks.append((f"Task {n} of list {lid}", rng.choice(["Uncompleted", "Completed"]),
+                          rng.randint(1, args.users) if rng.random() < 0.5 else None, due, lid, owner))
+    await _insert_many(cursor, "INSERT INTO Task (Description, Progress, Assignee, DateDue, ToDoListID, OwnerID)", tasks)
+    print(f"Seeded {args.users} users, {len(lists)} lists, {len(shares)} shares, {len(tasks)} tasks "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+async def _load_fixture(cursor):
+    """What the workload needs to know about the data: who can see which lists."""
+    await cursor.execute("SELECT UserID, Username FROM User;")
+    users = dict(await cursor.fetchall())
+    await cursor.execute("""
+        SELECT ToDoListID, UserID FROM ToDoList
+        UNION ALL
+        SELECT ToDoListID, UserID FROM ToDoListShare;
+    """)
+    visible = {}
+    for list_id, user_id in await cursor.fetchall():
+        visible.setdefault(user_id, []).append(list_id)
+    return {"users": users, "visible": visible}
+
+
+# ---------------------------------------------------------------- server
+
+def start_server(args):
+    env = dict(os.environ, DB_NAME=args.database, DB_MIGRATE_ON_STARTUP="0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "dbconnecttest:app", "--host", "127.0.0.1", "--port", str(args.port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env)
+    base_url = f"http://127.0.0.1:{args.port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            httpx.get(base_url + "/metrics", timeout=1)
+            return proc, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("Server did not become ready within 30s")
+
+
+# ---------------------------------------------------------------- workload
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    async def call(self, client, endpoint, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            failed = response.status_code >= 400
+        except httpx.HTTPError:
+            response, failed = None, True
+        self.samples.setdefault(endpoint, []).append(time.perf_counter() - start)
+        if failed:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        return response
+
+
+async def flow_focus(client, rec, rng, fixture):
+    user_id = rng.choice(list(fixture["visible"]))
+    await rec.call(client, "GET /todolists/{user_id}", "GET", f"/todolists/{user_id}")
+    list_id = rng.choice(fixture["visible"][user_id])
+    await rec.call(client, "GET /tasks/{todolist_id}", "GET", f"/tasks/{list_id}")
+    await rec.call(client, "GET /todolists/{todolist_id}/users", "GET", f"/todolists/{list_id}/users")
+
+
+async def flow_home(client, rec, rng, fixture):
+    user_id = rng.choice(list(fixture["visible"]))
+    list_id = rng.choice(fixture["visible"][user_id])
+    await rec.call(client, "GET /home/{user_id}", "GET", f"/home/{user_id}", params={"todolist_id": list_id})
+
+
+async def flow_add_refetch(client, rec, rng, fixture):
+    user_id = rng.choice(list(fixture["visible"]))
+    list_id = rng.choice(fixture["visible"][user_id])
+    await rec.call(client, "POST /tasks", "POST", "/tasks", json={
+        "description": "load test task", "todolist_id": list_id, "owner_id": user_id,
+        "due_date": (date.today() + timedelta(days=rng.randint(0, 14))).isoformat()})
+    await rec.call(client, "GET /tasks/{todolist_id}", "GET", f"/tasks/{list_id}")
+
+
+async def flow_toggle_refetch(client, rec, rng, fixture):
+    user_id = rng.choice(list(fixture["visible"]))
+    list_id = rng.choice(fixture["visible"][user_id])
+    response = await rec.call(client, "GET /tasks/{todolist_id}", "GET", f"/tasks/{list_id}", params={"limit": 50})
+    tasks = response.json()["tasks"] if response is not None and response.status_code == 200 else []
+    if not tasks:
+        return
+    task = rng.choice(tasks)
+    progress = "Uncompleted" if task["progress"] == "Completed" else "Completed"
+    await rec.call(client, "PUT /tasks/{task_id}", "PUT", f"/tasks/{task['id']}", json={"progress": progress})
+    await rec.call(client, "GET /tasks/{todolist_id}", "GET", f"/tasks/{list_id}")
+
+
+async def flow_join(client, rec, rng, fixture):
+    owner, joiner = rng.sample(list(fixture["users"]), 2)
+    response = await rec.call(client, "POST /todolists", "POST", "/todolists",
+                              params={"user_id": owner, "shared": 1, "name": "load test shared list"})
+    if response is None or response.status_code != 200:
+        return
+    code = response.json()["inviteCode"]
+    await rec.call(client, "POST /todolists/join", "POST", "/todolists/join",
+                   params={"user_id": joiner, "invite_code": code})
+    await rec.call(client, "GET /todolists/{user_id}", "GET", f"/todolists/{joiner}")
+
+
+async def flow_login(client, rec, rng, fixture):
+    username = fixture["users"][rng.choice(list(fixture["users"]))]
+    await rec.call(client, "POST /login", "POST", "/login", params={"username": username})
+
+
+FLOWS = {
+    "focus": flow_focus,
+    "home": flow_home,
+    "add_refetch": flow_add_refetch,
+    "toggle_refetch": flow_toggle_refetch,
+    "join": flow_join,
+    "login": flow_login,
+}
+
+
+async def run_level(base_url, fixture, concurrency, duration, mix, seed):
+    rec = Recorder()
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def worker(n):
+            rng = random.Random(seed * 1000 + n)
+            while time.monotonic() < deadline:
+                await FLOWS[rng.choices(names, weights)[0]](client, rec, rng, fixture)
+
+        metrics_before = parse_metrics((await client.get("/metrics")).text)
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        metrics_after = parse_metrics((await client.get("/metrics")).text)
+
+    queries = {}
+    for key, (total, count) in metrics_after.items():
+        prev_total, prev_count = metrics_before.get(key, (0, 0))
+        if count > prev_count:
+            queries[key] = {"requests": count - prev_count,
+                            "db_queries_per_request": round((total - prev_total) / (count - prev_count), 2)}
+
+    endpoints = {}
+    for endpoint, samples in sorted(rec.samples.items()):
+        endpoints[endpoint] = {
+            "requests": len(samples),
+            "errors": rec.errors.get(endpoint, 0),
+            "throughput_rps": round(len(samples) / elapsed, 2),
+            "p50_ms": percentile_ms(samples, 50),
+            "p95_ms": percentile_ms(samples, 95),
+            "p99_ms": percentile_ms(samples, 99),
+            "db_queries_per_request": queries.get(endpoint, {}).get("db_queries_per_request"),
+        }
+    total = sum(len(s) for s in rec.samples.values())
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "errors": sum(rec.errors.values()),
+        "throughput_rps": round(total / elapsed, 2),
+        "endpoints": endpoints,
+    }
+
+
+def percentile_ms(samples, pct):
+    if len(samples) == 1:
+        return round(samples[0] * 1000, 2)
+    return round(statistics.quantiles(samples, n=100, method="inclusive")[pct - 1] * 1000, 2)
+
+
+_DB_QUERIES = re.compile(r'^http_request_db_queries_(sum|count)\{method="(\w+)",route="([^"]+)"\} (\S+)$', re.M)
+
+
+def parse_metrics(text):
+    """{"GET /tasks/{todolist_id}": (query total, request count)} from the /metrics page."""
+    series = {}
+    for kind, method, route, value in _DB_QUERIES.findall(text):
+        total, count = series.get(f"{method} {route}", (0.0, 0))
+        if kind == "sum":
+            total = float(value)
+        else:
+            count = int(float(value))
+        series[f"{method} {route}"] = (total, count)
+    return series
+
+
+# ---------------------------------------------------------------- reporting
+
+def print_report(level):
+    print(f"\nconcurrency={level['concurrency']}  {level['requests']} requests in {level['duration_s']}s  "
+          f"{level['throughput_rps']} req/s  {level['errors']} errors")
+    print(f"  {'endpoint':<38}{'reqs':>7}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'q/req':>7}")
+    for endpoint, s in level["endpoints"].items():
+        q = "" if s["db_queries_per_request"] is None else s["db_queries_per_request"]
+        print(f"  {endpoint:<38}{s['requests']:>7}{s['throughput_rps']:>9}{s['p50_ms']:>9}"
+              f"{s['p95_ms']:>9}{s['p99_ms']:>9}{q:>7}")
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = {level["concurrency"]: level for level in json.load(f)["levels"]}
+    with open(after_path) as f:
+        after = {level["concurrency"]: level for level in json.load(f)["levels"]}
+    for concurrency in sorted(before.keys() & after.keys()):
+        b, a = before[concurrency], after[concurrency]
+        print(f"\nconcurrency={concurrency}  throughput {b['throughput_rps']} -> {a['throughput_rps']} req/s "
+              f"({_delta(b['throughput_rps'], a['throughput_rps'])})")
+        for endpoint in sorted(b["endpoints"].keys() & a["endpoints"].keys()):
+            bp, ap = b["endpoints"][endpoint]["p95_ms"], a["endpoints"][endpoint]["p95_ms"]
+            print(f"  {endpoint:<38} p95 {bp:>8} -> {ap:>8} ms ({_delta(bp, ap)})")
+
+
+def _delta(old, new):
+    return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seeded load test for the backend API.")
+    parser.add_argument("--base-url", help="drive an already running server instead of starting one")
+    parser.add_argument("--database", default="tododb_bench")
+    parser.add_argument("--reset", action="store_true", help="drop and reseed the benchmark database")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--lists-per-user", type=int, default=3)
+    parser.add_argument("--shared-ratio", type=float, default=0.3)
+    parser.add_argument("--members-per-shared-list", type=int, default=5)
+    parser.add_argument("--tasks-per-list", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=20, help="seconds per concurrency level")
+    parser.add_argument("--mix", type=json.loads, default=DEFAULT_MIX,
+                        help='flow weights as JSON, e.g. \'{"focus": 80, "login": 20}\'')
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write machine-readable results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    unknown = set(args.mix) - set(FLOWS)
+    if unknown:
+        parser.error(f"unknown flows in --mix: {sorted(unknown)}")
+
+    fixture = asyncio.run(seed(args))
+    proc = None
+    base_url = args.base_url
+    if base_url is None:
+        proc, base_url = start_server(args)
+    try:
+        levels = []
+        for concurrency in args.concurrency:
+            level = asyncio.run(run_level(base_url, fixture, concurrency, args.duration, args.mix, args.seed))
+            print_report(level)
+            levels.append(level)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        result = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("compare", "output")},
+            "levels": levels,
+        }
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
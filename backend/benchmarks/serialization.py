@@ -0,0 +1,115 @@
+"""Before/after cost of turning task rows into a response body, without a database.
+
+    python benchmarks/serialization.py                  # 10k-task page
+    python benchmarks/serialization.py --tasks 100000 --repeat 5
+
+Rows are tuples shaped like TASK_SELECT's, with date and datetime columns.
+Each path is timed from rows to the bytes that go on the wire:
+
+  before, cache miss   jsonable_encoder, json.dumps for the ETag, JSONResponse render
+  before, cache hit    JSONResponse re-rendering the cached payload
+  after, cache miss    one orjson.dumps, hashed for the ETag
+  after, cache hit     the stored body
+  before, uncached     jsonable_encoder + JSONResponse, what uncached handlers without a model did
+  response_model       FastAPI's serialize_response against TaskPage + ORJSONResponse,
+                       the path for uncached handlers that declare a model
+  ndjson               one orjson line per task, as GET /tasks/{id}?format=ndjson streams
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schemas import TaskPage  # noqa: E402
+
+
+def task_to_dict(t):
+    # Same mapping as dbconnecttest.task_to_dict, without importing the app.
+    return {"id": t[0], "description": t[1], "progress": t[2], "assignee": t[3], "due_date": t[4], "created_at": t[5], "todolist_id": t[6], "owner_id": t[7]}
+
+
+def make_rows(n):
+    created = datetime(2026, 1, 1, 9, 30)
+    return [
+        (i, f"Task {i}: review the quarterly report", "Completed" if i % 3 else "Uncompleted",
+         f"user_{i % 50}" if i % 2 else None, date(2026, 1, 1) + timedelta(days=i % 90) if i % 5 else None,
+         created + timedelta(minutes=i), 1 + i % 20, 1 + i % 50)
+        for i in range(1, n + 1)
+    ]
+
+
+def payload(rows):
+    return {"tasks": [task_to_dict(t) for t in rows], "next_cursor": None, "sync_token": 42}
+
+
+def before_miss(rows):
+    encoded = jsonable_encoder(payload(rows))
+    etag = hashlib.sha1(json.dumps(encoded, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+    return JSONResponse(encoded, headers={"ETag": etag}).body
+
+
+def after_miss(rows):
+    body = orjson.dumps(payload(rows))
+    hashlib.sha1(body).hexdigest()
+    return body
+
+
+def ndjson(rows):
+    return b"".join(orjson.dumps(task_to_dict(t), option=orjson.OPT_APPEND_NEWLINE) for t in rows)
+
+
+def time_it(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, len(result)
+
+
+def main(args):
+    rows = make_rows(args.tasks)
+    cached_payload = jsonable_encoder(payload(rows))
+    cached_body = orjson.dumps(payload(rows))
+    field = create_model_field(name="Response_get_tasks", type_=TaskPage, mode="serialization")
+
+    loop = asyncio.new_event_loop()
+
+    def response_model():
+        content = loop.run_until_complete(serialize_response(field=field, response_content=payload(rows)))
+        return ORJSONResponse(content).body
+
+    cases = [
+        ("before, cache miss", lambda: before_miss(rows)),
+        ("before, cache hit", lambda: JSONResponse(cached_payload).body),
+        ("after, cache miss", lambda: after_miss(rows)),
+        ("after, cache hit", lambda: cached_body.decode().encode()),
+        ("before, uncached", lambda: JSONResponse(jsonable_encoder(payload(rows))).body),
+        ("response_model", response_model),
+        ("ndjson", lambda: ndjson(rows)),
+    ]
+    print(f"{args.tasks:,} tasks, best of {args.repeat}")
+    baseline = None
+    for name, fn in cases:
+        seconds, size = time_it(fn, args.repeat)
+        baseline = baseline or seconds
+        print(f"{name:>20}  {seconds * 1000:9.2f} ms  {size / 1024:9.0f} KiB  {baseline / seconds:6.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    main(parser.parse_args())
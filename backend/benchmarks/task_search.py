@@ -0,0 +1,192 @@
+"""Query latency of task search on a large seeded database.
+
+    MYSQL_HOST=127.0.0.1 MYSQL_ROOT_PASSWORD=... python benchmarks/task_search.py
+    python benchmarks/task_search.py --tasks 2000000 --like   # also time the LIKE '%term%' baseline
+
+Seeds --database (default tododb_search_bench, never the app database) with
+--tasks synthetic tasks whose descriptions draw words from a Zipf-like
+vocabulary, so queries cover very common, mid-frequency and rare words. Then
+times search_tasks, the same code GET /search/{user_id} runs, for random
+users: the first page, and the page after it via the returned cursor.
+Re-runs reuse the seeded data unless --reset is passed.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Database, PoolConfig  # noqa: E402
+from migrate import migrate  # noqa: E402
+from search import boolean_query, search_tasks  # noqa: E402
+
+COMMON_WORDS = ["buy", "call", "email", "review", "fix", "plan", "write", "book", "pay", "clean",
+                "meeting", "report", "groceries", "dentist", "invoice", "project", "homework", "laundry"]
+
+
+def vocabulary(rng, size):
+    """Returns (words, cumulative Zipf weights); the common words get the largest weights."""
+    words = set(COMMON_WORDS)
+    while len(words) < size:
+        words.add("".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(4, 9))))
+    rest = sorted(words - set(COMMON_WORDS))
+    rng.shuffle(rest)
+    words = COMMON_WORDS + rest
+    return words, list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+
+
+def queries(words):
+    return {
+        "common": ["review", "call"],
+        "two words": ["review report", "buy groceries"],
+        "prefix": ["groc", "meet"],
+        "mid": words[200:220],
+        "rare": words[-20:],
+    }
+
+
+async def seed(args):
+    config = PoolConfig()
+    config.database = None
+    config.minsize = 1
+    admin = Database(config)
+    await admin.connect()
+    async with admin.acquire() as connection:
+        async with connection.cursor() as cursor:
+            if args.reset:
+                await cursor.execute(f"DROP DATABASE IF EXISTS `{args.database}`;")
+            await cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{args.database}`;")
+    await admin.close()
+
+    config = PoolConfig()
+    config.database = args.database
+    config.minsize = 1
+    database = Database(config)
+    await database.connect()
+    await migrate(database)
+    async with database.acquire() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute("SELECT COUNT(*) FROM Task;")
+            if (await cursor.fetchone())[0] and not args.reset:
+                print("Reusing existing seed data (pass --reset to reseed)")
+            else:
+                await _insert_seed_data(connection, cursor, args)
+    return database
+
+
+async def _insert_many(cursor, sql_prefix, rows):
+    placeholders = ", ".join(["(" + ", ".join(["%s"] * len(rows[0])) + ")"] * len(rows))
+    await cursor.execute(f"{sql_prefix} VALUES {placeholders};", tuple(v for row in rows for v in row))
+
+
+async def _insert_seed_data(connection, cursor, args):
+    rng = random.Random(args.seed)
+    words, cum_weights = vocabulary(rng, args.vocabulary)
+    lists_total = args.users * args.lists_per_user
+    start = time.perf_counter()
+
+    await _insert_many(cursor, "INSERT INTO User (UserID, Username)",
+                       [(u, f"search_user_{u}") for u in range(1, args.users + 1)])
+    await _insert_many(cursor, "INSERT INTO ToDoList (ToDoListID, SharedFlag, UserID, Name)",
+                       [(lid, 0, (lid - 1) // args.lists_per_user + 1, f"List {lid}")
+                        for lid in range(1, lists_total + 1)])
+    shares = {(rng.randint(1, lists_total), rng.randint(1, args.users)) for _ in range(lists_total // 2)}
+    await _insert_many(cursor, "INSERT IGNORE INTO ToDoListShare (ToDoListID, UserID)", sorted(shares))
+    await connection.commit()
+
+    # Committing per chunk keeps InnoDB's full-text cache from growing with the whole load.
+    for offset in range(0, args.tasks, args.chunk):
+        rows = []
+        for _ in range(min(args.chunk, args.tasks - offset)):
+            lid = rng.randint(1, lists_total)
+            description = " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(2, 8))).capitalize()
+            rows.append((description, "Uncompleted", lid, (lid - 1) // args.lists_per_user + 1))
+        await _insert_many(cursor, "INSERT INTO Task (Description, Progress, ToDoListID, OwnerID)", rows)
+        await connection.commit()
+        print(f"\r{offset + len(rows):,} tasks", end="", flush=True)
+    await cursor.execute("OPTIMIZE TABLE Task;")  # merges the full-text index into its final form
+    await cursor.fetchall()
+    print(f"\nSeeded {args.users} users, {lists_total} lists, {args.tasks:,} tasks "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+async def _like_baseline(cursor, user_id, text, limit):
+    conditions, params = [], []
+    for word in text.split():
+        conditions.append("Task.Description LIKE %s")
+        params.append(f"%{word}%")
+    await cursor.execute(f"""
+        SELECT Task.TaskID FROM Task
+        WHERE {' AND '.join(conditions)}
+          AND Task.ToDoListID IN (SELECT ToDoListID FROM ToDoList WHERE UserID = %s
+                                  UNION SELECT ToDoListID FROM ToDoListShare WHERE UserID = %s)
+        ORDER BY Task.TaskID DESC LIMIT %s
+    """, (*params, user_id, user_id, limit))
+    await cursor.fetchall()
+
+
+def summary(samples):
+    q = statistics.quantiles(samples, n=100)
+    return f"p50 {q[49] * 1000:7.2f} ms  p95 {q[94] * 1000:7.2f} ms  p99 {q[98] * 1000:7.2f} ms"
+
+
+async def run(database, args):
+    words, _ = vocabulary(random.Random(args.seed), args.vocabulary)
+    rng = random.Random(args.seed + 1)
+    async with database.acquire() as connection:
+        async with connection.cursor() as cursor:
+            for kind, texts in queries(words).items():
+                first, second, like, hits = [], [], [], []
+                for _ in range(args.iterations):
+                    text = rng.choice(texts)
+                    user_id = rng.randint(1, args.users)
+                    query = boolean_query(text)
+
+                    start = time.perf_counter()
+                    rows, next_cursor = await search_tasks(cursor, user_id, query, args.limit)
+                    first.append(time.perf_counter() - start)
+                    hits.append(len(rows))
+                    if next_cursor is not None:
+                        start = time.perf_counter()
+                        await search_tasks(cursor, user_id, query, args.limit, next_cursor)
+                        second.append(time.perf_counter() - start)
+                    if args.like:
+                        start = time.perf_counter()
+                        await _like_baseline(cursor, user_id, text, args.limit)
+                        like.append(time.perf_counter() - start)
+                    await connection.rollback()  # fresh snapshot, like a new request
+
+                print(f"{kind:>10}  first page {summary(first)}  (avg {statistics.mean(hits):.1f} hits)")
+                if len(second) >= 2:
+                    print(f"{'':>10}  next page  {summary(second)}")
+                if like:
+                    print(f"{'':>10}  LIKE       {summary(like)}")
+
+
+async def main(args):
+    database = await seed(args)
+    try:
+        await run(database, args)
+    finally:
+        await database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default="tododb_search_bench")
+    parser.add_argument("--reset", action="store_true", help="drop and reseed the database")
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--lists-per-user", type=int, default=5)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--chunk", type=int, default=5000, help="tasks per INSERT/commit while seeding")
+    parser.add_argument("--iterations", type=int, default=200, help="searches per query kind")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--like", action="store_true", help="also time a LIKE '%%term%%' scan for comparison")
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,260 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+
+import orjson
+from fastapi import Response
+
+from db import READ_YOUR_WRITES_WINDOW
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class LRUCache:
+    """In-process LRU with a per-entry TTL.
+
+    Entries live under a group (e.g. "tasks:42") so a write can drop every
+    cached variant of a resource at once. Each replica has its own copy, so
+    with several replicas use RedisCache to keep invalidation exact.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._groups = {}
+        self._generations = {}
+        self._invalidated_at = {}
+
+    async def get(self, group, key):
+        entry = self._entries.get((group, key))
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            self._remove((group, key))
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end((group, key))
+        self.stats.hits += 1
+        return value
+
+    async def generation(self, group):
+        return self._generations.get(group, 0)
+
+    async def set(self, group, key, value, generation):
+        # A write that invalidated the group while this value was being loaded
+        # makes the value stale, so don't cache it.
+        if self._generations.get(group, 0) != generation:
+            return
+        self._entries[(group, key)] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end((group, key))
+        self._groups.setdefault(group, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats.evictions += 1
+
+    async def invalidate(self, *groups):
+        now = time.monotonic()
+        for group in groups:
+            self._generations[group] = self._generations.get(group, 0) + 1
+            self._invalidated_at[group] = now
+            for key in self._groups.pop(group, ()):
+                self._entries.pop((group, key), None)
+            self.stats.invalidations += 1
+        if len(self._invalidated_at) > self.max_entries:
+            self._invalidated_at = {g: at for g, at in self._invalidated_at.items()
+                                    if now - at < READ_YOUR_WRITES_WINDOW}
+
+    async def invalidated_within(self, group, seconds):
+        at = self._invalidated_at.get(group)
+        return at is not None and time.monotonic() - at < seconds
+
+    def _remove(self, full_key):
+        group, key = full_key
+        self._entries.pop(full_key, None)
+        keys = self._groups.get(group)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._groups[group]
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    """Cache shared by all replicas on a Redis-compatible server. Needs the optional `redis` package."""
+
+    prefix = "cache:"
+
+    # Compare-and-set on the group's generation: the check and the write run
+    # as one script, so an invalidate from another replica can't land between them.
+    _set_script = """
+        if tonumber(redis.call("GET", KEYS[1]) or "0") ~= tonumber(ARGV[1]) then
+            return 0
+        end
+        redis.call("SET", KEYS[2], ARGV[2], "EX", ARGV[4])
+        redis.call("SADD", KEYS[3], ARGV[3])
+        redis.call("EXPIRE", KEYS[3], ARGV[4])
+        return 1
+    """
+
+    def __init__(self, url, ttl):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self._set = self._redis.register_script(self._set_script)
+        self.ttl = ttl
+        self.stats = CacheStats()
+
+    async def get(self, group, key):
+        raw = await self._redis.get(f"{self.prefix}{group}:{key}")
+        if raw is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return json.loads(raw)
+
+    async def generation(self, group):
+        return int(await self._redis.get(f"{self.prefix}gen:{group}") or 0)
+
+    async def set(self, group, key, value, generation):
+        await self._set(
+            keys=[f"{self.prefix}gen:{group}", f"{self.prefix}{group}:{key}", f"{self.prefix}group:{group}"],
+            args=[generation, json.dumps(value), key, int(self.ttl)],
+        )
+
+    async def invalidate(self, *groups):
+        for group in groups:
+            # Bump the generation first: from then on no set() for the group
+            # succeeds, so the members read next are all the keys to delete.
+            await self._redis.incr(f"{self.prefix}gen:{group}")
+            await self._redis.set(f"{self.prefix}invalidated:{group}", time.time(),
+                                  ex=max(1, math.ceil(READ_YOUR_WRITES_WINDOW)))
+            members = await self._redis.smembers(f"{self.prefix}group:{group}")
+            keys = [f"{self.prefix}{group}:{m.decode()}" for m in members]
+            await self._redis.delete(f"{self.prefix}group:{group}", *keys)
+            self.stats.invalidations += 1
+
+    async def invalidated_within(self, group, seconds):
+        at = await self._redis.get(f"{self.prefix}invalidated:{group}")
+        return at is not None and time.time() - float(at) < seconds
+
+    def size(self):
+        return None
+
+
+# 0 turns the response cache off: reads go straight to load() and writes skip invalidation.
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+
+
+def cache_from_env():
+    ttl = float(os.getenv("CACHE_TTL", 30))
+    url = os.getenv("CACHE_URL", "")
+    if url.startswith(("redis://", "rediss://")):
+        return RedisCache(url, ttl)
+    return LRUCache(int(os.getenv("CACHE_MAX_ENTRIES", 10000)), ttl)
+
+
+cache = cache_from_env()
+
+
+def _etag(body):
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+async def cached_response(request, group, key, load):
+    """Serves `load(fresh)`'s payload through the cache, answering 304 when the client's ETag still matches.
+
+    `fresh` asks load() to read from the primary: the group was invalidated
+    within the read-your-writes window, by any replica of the app, so a read
+    replica may not have the write yet and its copy would be cached for the
+    whole TTL.
+    """
+    if not CACHE_ENABLED:
+        body = orjson.dumps(await load(False))
+        return _response(request, {"body": body, "etag": _etag(body)})
+
+    entry = None
+    generation = None
+    try:
+        entry = await cache.get(group, key)
+        generation = await cache.generation(group)
+    except Exception:
+        logger.exception("Cache read failed for %s", group)
+    if entry is None:
+        try:
+            fresh = await cache.invalidated_within(group, READ_YOUR_WRITES_WINDOW)
+        except Exception:
+            logger.exception("Cache read failed for %s", group)
+            fresh = True
+        # Encoded once on a miss; hits reuse the stored body.
+        body = orjson.dumps(await load(fresh))
+        entry = {"body": body.decode(), "etag": _etag(body)}
+        try:
+            if generation is not None:
+                await cache.set(group, key, entry, generation)
+        except Exception:
+            logger.exception("Cache write failed for %s", group)
+    return _response(request, entry)
+
+
+def _response(request, entry):
+    etag = entry["etag"]
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(entry["body"], media_type="application/json", headers={"ETag": etag})
+
+
+async def invalidate(*groups):
+    if not CACHE_ENABLED:
+        return
+    try:
+        await cache.invalidate(*groups)
+    except Exception:
+        logger.exception("Cache invalidation failed for %s", groups)
+
+
+def cache_stats():
+    return {"enabled": CACHE_ENABLED, **cache.stats.as_dict(), "entries": cache.size()}
+
+
+@registry.collector
+def _cache_metrics():
+    stats = cache.stats
+    return [
+        ("cache_hits_total", "counter", "Read-through cache hits.", stats.hits),
+        ("cache_misses_total", "counter", "Read-through cache misses.", stats.misses),
+        ("cache_evictions_total", "counter", "Entries evicted to stay under the size limit.", stats.evictions),
+        ("cache_invalidations_total", "counter", "Cache groups invalidated by writes.", stats.invalidations),
+    ]
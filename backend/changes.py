@@ -0,0 +1,80 @@
+TASK_UPSERT = "upsert"
+TASK_DELETE = "delete"
+
+CHANGE_SEQ_SELECT = "SELECT ChangeSeq FROM ToDoList WHERE ToDoListID = %s;"
+CHANGES_SINCE_SELECT = """
+    SELECT ChangeSeq, TaskID, ChangeType
+    FROM TaskChange
+    WHERE ToDoListID = %s AND ChangeSeq > %s
+    ORDER BY ChangeSeq
+    LIMIT %s;
+"""
+
+
+async def lock_lists_for_insert(cursor, todolist_ids):
+    """Takes the ToDoList row locks record_task_changes needs before any Task row is inserted.
+
+    Inserting a Task share-locks its ToDoList row through fk_task_todolist.
+    Two inserts into one list would both hold that shared lock and deadlock
+    upgrading it for the ChangeSeq UPDATE, so lock the rows exclusively
+    first, in id order, and concurrent inserts queue instead. Returns the ids
+    of the lists that exist.
+    """
+    ids = sorted(set(todolist_ids))
+    placeholders = ", ".join(["%s"] * len(ids))
+    await cursor.execute(
+        f"SELECT ToDoListID FROM ToDoList WHERE ToDoListID IN ({placeholders}) ORDER BY ToDoListID FOR UPDATE;",
+        tuple(ids),
+    )
+    return {row[0] for row in await cursor.fetchall()}
+
+
+async def record_task_change(cursor, todolist_id, task_id, change_type):
+    """Bumps the list's change sequence and logs the change under the new value.
+
+    The UPDATE holds the ToDoList row lock until the caller commits, so
+    sequence numbers within a list become visible in commit order and a
+    client holding token N can never miss a change numbered below N.
+    """
+    return (await record_task_changes(cursor, todolist_id, [task_id], change_type))[-1]
+
+
+async def record_task_changes(cursor, todolist_id, task_ids, change_type):
+    """Batch form of record_task_change: reserves one sequence number per task in a single UPDATE."""
+    await cursor.execute(
+        "UPDATE ToDoList SET ChangeSeq = LAST_INSERT_ID(ChangeSeq + %s) WHERE ToDoListID = %s;",
+        (len(task_ids), todolist_id),
+    )
+    await cursor.execute("SELECT LAST_INSERT_ID();")
+    last = (await cursor.fetchone())[0]
+    seqs = list(range(last - len(task_ids) + 1, last + 1))
+    placeholders = ", ".join(["(%s, %s, %s, %s)"] * len(task_ids))
+    values = []
+    for seq, task_id in zip(seqs, task_ids):
+        values.extend((todolist_id, seq, task_id, change_type))
+    await cursor.execute(
+        f"INSERT INTO TaskChange (ToDoListID, ChangeSeq, TaskID, ChangeType) VALUES {placeholders};",
+        tuple(values),
+    )
+    return seqs
+
+
+async def current_change_seq(cursor, todolist_id):
+    """Returns the list's latest change sequence, or None if the list doesn't exist."""
+    await cursor.execute(CHANGE_SEQ_SELECT, (todolist_id,))
+    row = await cursor.fetchone()
+    return row[0] if row else None
+
+
+async def changes_since(cursor, todolist_id, since, limit):
+    """Returns ({task_id: change_type} for the latest change per task, new token, has_more)."""
+    await cursor.execute(CHANGES_SINCE_SELECT, (todolist_id, since, limit + 1))
+    rows = await cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for _, task_id, change_type in rows:
+        latest[task_id] = change_type
+    token = rows[-1][0] if rows else since
+    return latest, token, has_more
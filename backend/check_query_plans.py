@@ -0,0 +1,111 @@
+"""EXPLAIN every hot-path endpoint query and fail if one scans a whole table.
+
+Run against a migrated database with production-like data (exit status 1 on
+failure, so it can gate CI). On near-empty tables MySQL rightly prefers
+scans, so seed first, e.g. with the database the search benchmark leaves
+behind:
+
+    python benchmarks/task_search.py
+    DB_NAME=tododb_search_bench python check_query_plans.py
+
+The statements are built from the same constants and helpers the handlers
+and jobs run, so a query change is checked as shipped. A plan step fails
+when it reads a base table with "type: ALL", whether or not an index was a
+candidate, unless the table is in ALLOWED_FULL_SCANS. Scans of intermediate
+results (<union1,2>, <derived2>, ...) are fine; their inputs are checked as
+their own steps.
+"""
+import asyncio
+import sys
+from datetime import date
+
+from changes import CHANGE_SEQ_SELECT, CHANGES_SINCE_SELECT
+from db import Database, PoolConfig
+from dbconnecttest import (DUE_SUMMARY_SELECT, HOME_COUNTS_SELECT, HOME_MEMBERS_SELECT, JOIN_WITH_INVITE_CODE_INSERT,
+                           LIST_MEMBERS_SELECT, LIST_OWNER_SELECT, LIST_USER_IDS_SELECT, MEMBERSHIP_SELECT,
+                           USER_ID_SELECT, VISIBLE_LISTS_SELECT, task_list_query)
+from invites import INVITE_CODE_SELECT
+from jobs import (DUE_ROLLUP_SELECT, PENDING_REMINDERS_SELECT, REMINDER_BATCH_SIZE, REMINDER_DUE_SOON,
+                  REMINDER_OVERDUE)
+from pagination import encode_cursor
+from search import search_query
+
+# Base tables small enough that reading all of them is the right plan.
+ALLOWED_FULL_SCANS = set()
+
+PAGE_SIZE = 50
+TWO_LISTS = "%s, %s"
+
+
+def task_page(*args, **kwargs):
+    """A GET /tasks/{todolist_id} page as the handler runs it: task_list_query plus LIMIT."""
+    sql, params = task_list_query(*args, **kwargs)
+    return sql + " LIMIT %s", (*params, PAGE_SIZE + 1)
+
+
+# (endpoint, query, sample params)
+QUERIES = [
+    ("POST /register, /login", USER_ID_SELECT, ("alice",)),
+    ("GET /todolists/{user_id}, /home/{user_id}", VISIBLE_LISTS_SELECT, (1, 1, 1)),
+    ("GET /home/{user_id} members", HOME_MEMBERS_SELECT.format(placeholders=TWO_LISTS), (1, 2, 1, 2)),
+    ("GET /home/{user_id} counts", HOME_COUNTS_SELECT.format(placeholders=TWO_LISTS), (1, 2)),
+    ("GET /home/{user_id} due rollup", DUE_SUMMARY_SELECT, (1,)),
+    ("GET /home/{user_id} tasks", *task_page(1)),
+    ("POST /todolists/join", INVITE_CODE_SELECT, ("ABCDEFGH",)),
+    ("POST /todolists/join, /todolists/{todolist_id}/leave membership", MEMBERSHIP_SELECT, (1, 1)),
+    ("POST /todolists/join insert", JOIN_WITH_INVITE_CODE_INSERT, (1, 1, "ABCDEFGH")),
+    ("list members for cache invalidation", LIST_USER_IDS_SELECT, (1, 1)),
+    ("GET /todolists/{todolist_id}/users owner", LIST_OWNER_SELECT, (1,)),
+    ("GET /todolists/{todolist_id}/users members", LIST_MEMBERS_SELECT, (1,)),
+    ("GET /tasks/{todolist_id}", *task_page(1)),
+    ("GET /tasks/{todolist_id}?cursor", *task_page(1, after=(100, 100))),
+    ("GET /tasks/{todolist_id}?sort=due_date&due_from&due_to",
+     *task_page(1, "due_date", due_from=date(2026, 1, 1), due_to=date(2026, 1, 31))),
+    ("GET /tasks/{todolist_id}?sort=due_date&cursor", *task_page(1, "due_date", after=(date(2026, 1, 15), 100))),
+    ("GET /tasks/{todolist_id}?sort=due_date&cursor (undated)", *task_page(1, "due_date", after=(None, 100))),
+    ("GET /tasks/{todolist_id}?progress", *task_page(1, progress="Completed")),
+    ("GET /tasks/{todolist_id}?assignee", *task_page(1, assignee=1)),
+    ("GET /tasks/{todolist_id}/changes sync token", CHANGE_SEQ_SELECT, (1,)),
+    ("GET /tasks/{todolist_id}/changes", CHANGES_SINCE_SELECT, (1, 0, 1001)),
+    ("GET /search/{user_id}", *search_query(1, "+groc*", 20)),
+    ("GET /search/{user_id}?todolist_id&cursor",
+     *search_query(1, "+groc*", 20, encode_cursor("relevance", 1.5, 100), todolist_id=1)),
+    ("job due_rollup", DUE_ROLLUP_SELECT, (1,)),
+    ("job reminders due soon", PENDING_REMINDERS_SELECT, (REMINDER_DUE_SOON, 0, 1, REMINDER_BATCH_SIZE)),
+    ("job reminders overdue", PENDING_REMINDERS_SELECT, (REMINDER_OVERDUE, -1, -1, REMINDER_BATCH_SIZE)),
+]
+
+
+async def check(database):
+    failures = []
+    async with database.acquire() as connection:
+        async with connection.cursor() as cursor:
+            for endpoint, sql, params in QUERIES:
+                await cursor.execute("EXPLAIN " + sql, params)
+                columns = [d[0] for d in cursor.description]
+                for row in await cursor.fetchall():
+                    step = dict(zip(columns, row))
+                    table = step["table"] or ""
+                    if step["type"] == "ALL" and not table.startswith("<") and table not in ALLOWED_FULL_SCANS:
+                        reason = "" if step["possible_keys"] else ", no usable index"
+                        failures.append(f"{endpoint}: full scan of {table}{reason}")
+    return failures
+
+
+async def main():
+    config = PoolConfig()
+    config.minsize = 1
+    database = Database(config)
+    await database.connect()
+    try:
+        failures = await check(database)
+    finally:
+        await database.close()
+    for failure in failures:
+        print("FAIL", failure)
+    print(f"{len(QUERIES)} queries checked, {len(failures)} full table scan(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,129 @@
+"""Check read routing against a primary and its read replicas.
+
+Needs a second MySQL server. Locally, two containers do; the second one can
+be a real replica or a plain copy of the schema standing in for one (a
+server that reports no replication status counts as caught up):
+
+    docker run -d --name tododb-primary -p 3306:3306 -e MYSQL_ROOT_PASSWORD=pw mysql:8.0 --server-id=1
+    docker run -d --name tododb-replica -p 3307:3306 -e MYSQL_ROOT_PASSWORD=pw mysql:8.0 --server-id=2
+    export MYSQL_HOST=127.0.0.1 MYSQL_ROOT_PASSWORD=pw
+    python migrate.py && MYSQL_PORT=3307 python migrate.py
+    DB_REPLICA_HOSTS=127.0.0.1:3307 python check_replica_routing.py
+
+For real replication, point the second server at the first with CHANGE
+REPLICATION SOURCE TO ... and START REPLICA, and migrate only the primary.
+
+The check adds an unreachable replica (127.0.0.1:1) to the configured ones,
+then fails (exit status 1) unless:
+
+  - plain reads are served by a live replica, never the dead one
+  - fresh reads and reads inside a client's read-your-writes window, sent
+    through ReadYourWritesMiddleware, are served by the primary
+  - a replica that dies between health checks makes reads fall back to the
+    primary and is taken out of rotation
+"""
+import asyncio
+import sys
+
+from db import Database, PoolConfig, ReadYourWritesMiddleware, replicas_from_env
+
+READS = 20
+
+
+async def server_of(connection):
+    async with connection.cursor() as cursor:
+        await cursor.execute("SELECT @@hostname, @@port, @@server_id;")
+        return "{}:{} (server_id {})".format(*await cursor.fetchone())
+
+
+async def read_from(database, fresh=False):
+    async with database.acquire_read(fresh=fresh) as connection:
+        return await server_of(connection)
+
+
+async def through_middleware(database, method, headers=()):
+    """Runs one request through ReadYourWritesMiddleware: (server an acquire_read() hit, response headers)."""
+    served_by = []
+    response_headers = []
+
+    async def app(scope, receive, send):
+        served_by.append(await read_from(database))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response_headers.extend(message["headers"])
+
+    scope = {"type": "http", "method": method, "path": "/", "headers": list(headers)}
+    await ReadYourWritesMiddleware(app, database)(scope, receive, send)
+    return served_by[0], dict(response_headers)
+
+
+async def check(database):
+    failures = []
+    async with database.acquire() as connection:
+        primary = await server_of(connection)
+    await database.check_replicas()
+    for replica in database.replicas:
+        print(f"replica {replica.name}: {'healthy' if replica.healthy else 'down'}, lag {replica.lag}")
+    dead = database.replicas[-1]
+    if dead.healthy:
+        failures.append(f"unreachable replica {dead.name} was marked healthy")
+    if not any(r.healthy for r in database.replicas[:-1]):
+        failures.append("no configured replica is healthy")
+
+    served = [await read_from(database) for _ in range(READS)]
+    print(f"primary {primary}; {READS} reads served by {sorted(set(served))}")
+    if primary in served and any(r.healthy for r in database.replicas):
+        failures.append("a read went to the primary while a replica was healthy")
+
+    if await read_from(database, fresh=True) != primary:
+        failures.append("a fresh read did not go to the primary")
+    _, written = await through_middleware(database, "POST")
+    deadline = written[ReadYourWritesMiddleware.header]
+    served_by, _ = await through_middleware(database, "GET", [(ReadYourWritesMiddleware.header, deadline)])
+    if served_by != primary:
+        failures.append("a read inside the read-your-writes window did not go to the primary")
+    served_by, _ = await through_middleware(database, "GET", [(b"cookie", written[b"set-cookie"].split(b";")[0])])
+    if served_by != primary:
+        failures.append("a read with the read-your-writes cookie did not go to the primary")
+
+    # As if the replica went away after its last health check.
+    for replica in database.replicas:
+        replica.healthy = replica is dead
+    if await read_from(database) != primary:
+        failures.append("a read did not fall back to the primary when its replica was down")
+    if dead.healthy:
+        failures.append(f"replica {dead.name} stayed in rotation after a failed checkout")
+    return failures
+
+
+async def main():
+    configs = replicas_from_env()
+    if not configs:
+        print("Set DB_REPLICA_HOSTS to at least one replica, e.g. DB_REPLICA_HOSTS=127.0.0.1:3307")
+        return 2
+    unreachable = PoolConfig()
+    unreachable.host, unreachable.port = "127.0.0.1", 1
+    config = PoolConfig()
+    config.minsize = 1
+    for c in configs + [unreachable]:
+        c.minsize = 1
+    database = Database(config, replicas=configs + [unreachable])
+    await database.connect()
+    try:
+        failures = await check(database)
+    finally:
+        await database.close()
+    for failure in failures:
+        print("FAIL", failure)
+    print(f"replica routing: {len(failures)} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
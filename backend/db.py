@@ -0,0 +1,411 @@
+import asyncio
+import contextvars
+import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+import aiomysql
+import pymysql
+
+from metrics import db_acquire_duration, db_reads, db_replica_healthy, db_replica_lag, observe_query, registry
+
+logger = logging.getLogger(__name__)
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+# Read replicas, as "host[:port],..."; they share the primary's credentials and
+# pool settings. Empty means every read goes to the primary.
+REPLICA_HOSTS = os.getenv("DB_REPLICA_HOSTS", "")
+# A replica further behind than this (seconds) stops getting reads.
+REPLICA_MAX_LAG = _env_float("DB_REPLICA_MAX_LAG", 3)
+REPLICA_HEALTHCHECK_INTERVAL = _env_float("DB_REPLICA_HEALTHCHECK_INTERVAL", 5)
+REPLICA_HEALTHCHECK_TIMEOUT = _env_float("DB_REPLICA_HEALTHCHECK_TIMEOUT", 2)
+# After a client writes, its reads go to the primary for this long. Keep it
+# above REPLICA_MAX_LAG.
+READ_YOUR_WRITES_WINDOW = _env_float("DB_READ_YOUR_WRITES_WINDOW", 5)
+
+# Wall-clock time until which the current request's reads go to the primary,
+# set by ReadYourWritesMiddleware.
+_read_primary_until = contextvars.ContextVar("read_primary_until", default=0.0)
+
+
+class PoolConfig:
+    def __init__(self):
+        self.host = os.getenv("MYSQL_HOST", "mysql")
+        self.port = _env_int("MYSQL_PORT", 3306)
+        self.user = os.getenv("MYSQL_USER", "root")
+        self.password = os.getenv("MYSQL_ROOT_PASSWORD")
+        # MYSQL_DATABASE in the k3s manifest points at an unused schema, so the
+        # app database has its own variable.
+        self.database = os.getenv("DB_NAME", "tododb")
+        self.minsize = _env_int("DB_POOL_MIN_SIZE", 2)
+        self.maxsize = _env_int("DB_POOL_MAX_SIZE", 10)
+        # Connections older than this are closed and reopened (seconds, -1 disables).
+        self.recycle = _env_int("DB_POOL_RECYCLE", 1800)
+        # Idle connections are pinged before reuse once they've been idle this long.
+        self.healthcheck_interval = _env_float("DB_POOL_HEALTHCHECK_INTERVAL", 30)
+        self.acquire_timeout = _env_float("DB_POOL_ACQUIRE_TIMEOUT", 10)
+        # On shutdown, how long to wait for checked-out connections to come back.
+        self.close_timeout = _env_float("DB_POOL_CLOSE_TIMEOUT", 10)
+
+
+class InstrumentedCursor(aiomysql.Cursor):
+    """Cursor that reports every statement's latency and row count to metrics."""
+
+    async def execute(self, query, args=None):
+        start = time.perf_counter()
+        try:
+            result = await super().execute(query, args)
+        except Exception:
+            observe_query(query, args, time.perf_counter() - start, None, failed=True)
+            raise
+        observe_query(query, args, time.perf_counter() - start, self._observed_rows())
+        return result
+
+    def _observed_rows(self):
+        return self.rowcount
+
+
+class InstrumentedSSCursor(InstrumentedCursor, aiomysql.SSCursor):
+    """Unbuffered cursor for streaming large results; rows are read from the socket as they're fetched."""
+
+    def _observed_rows(self):
+        # The row count isn't known until the result has been read to the end.
+        return None
+
+
+class PoolStats:
+    def __init__(self):
+        self.in_use = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self.failed_healthchecks = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def record_wait(self, seconds):
+        self.acquired += 1
+        self.wait_time_total += seconds
+        self.wait_time_max = max(self.wait_time_max, seconds)
+
+
+class Replica:
+    def __init__(self, database):
+        self.database = database
+        self.name = f"{database.config.host}:{database.config.port}"
+        self.healthy = False
+        self.lag = None
+        # One check at a time, so two can't both open a pool for it.
+        self.checking = asyncio.Lock()
+
+
+class Database:
+    def __init__(self, config=None, replicas=()):
+        self.config = config or PoolConfig()
+        self.pool = None
+        self.stats = PoolStats()
+        # Read replicas behind acquire_read(); they start out unhealthy and are
+        # connected by the health check, so a down replica never delays startup.
+        self.replicas = [Replica(Database(c)) for c in replicas]
+        self._next_replica = 0
+        self._replica_health = None
+
+    async def connect(self):
+        if self.replicas and self._replica_health is None:
+            self._replica_health = asyncio.create_task(self._watch_replicas())
+        if self.pool is not None:
+            return
+        c = self.config
+        self.pool = await aiomysql.create_pool(
+            host=c.host,
+            port=c.port,
+            user=c.user,
+            password=c.password or "",
+            db=c.database,
+            minsize=c.minsize,
+            maxsize=c.maxsize,
+            pool_recycle=c.recycle,
+            autocommit=False,
+            cursorclass=InstrumentedCursor,
+        )
+
+    async def close(self):
+        if self._replica_health is not None:
+            self._replica_health.cancel()
+            try:
+                await self._replica_health
+            except asyncio.CancelledError:
+                pass
+            self._replica_health = None
+        for replica in self.replicas:
+            await replica.database.close()
+        if self.pool is None:
+            return
+        # Idle connections close now; ones still in use close as they're released.
+        self.pool.close()
+        try:
+            await asyncio.wait_for(self.pool.wait_closed(), self.config.close_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%d database connections still in use after %.0fs, closing them",
+                           self.stats.in_use, self.config.close_timeout)
+            self.pool.terminate()
+            await self.pool.wait_closed()
+        self.pool = None
+
+    async def ping(self, timeout):
+        """Round trip to the database on a pooled connection; raises if it can't be done within `timeout`."""
+        async def check():
+            async with self.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    await cursor.execute("SELECT 1;")
+                    await cursor.fetchone()
+
+        await asyncio.wait_for(check(), timeout)
+
+    async def _checkout(self):
+        start = time.perf_counter()
+        try:
+            conn = await asyncio.wait_for(self.pool.acquire(), self.config.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            raise RuntimeError("Timed out waiting for a database connection")
+        waited = time.perf_counter() - start
+        self.stats.record_wait(waited)
+        db_acquire_duration.observe(waited)
+
+        idle_for = asyncio.get_running_loop().time() - conn.last_usage
+        if idle_for > self.config.healthcheck_interval:
+            try:
+                await conn.ping(reconnect=True)
+            except Exception:
+                self.stats.failed_healthchecks += 1
+                self.pool.release(conn)
+                raise
+        return conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self.pool is None:
+            raise RuntimeError("Database pool is not initialised")
+        async with self._checked_out(await self._checkout()) as conn:
+            yield conn
+
+    @asynccontextmanager
+    async def acquire_read(self, fresh=False):
+        """A connection for a read that may lag the primary by up to REPLICA_MAX_LAG.
+
+        Comes from a healthy replica, round-robin, or the primary when there is
+        none, when the client is inside its read-your-writes window, or when
+        `fresh` is set. Anything that writes, or re-reads what it just wrote,
+        uses acquire().
+        """
+        replica = None
+        if not fresh and time.time() >= _read_primary_until.get():
+            replica = self._pick_replica()
+        conn = None
+        if replica is not None:
+            try:
+                conn = await replica.database._checkout()
+            except Exception as e:
+                self._set_replica_health(replica, False, None, e)
+                replica = None
+        if replica is None:
+            db_reads.inc("primary")
+            async with self.acquire() as connection:
+                yield connection
+            return
+        db_reads.inc("replica")
+        async with replica.database._checked_out(conn) as connection:
+            yield connection
+
+    def _pick_replica(self):
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return None
+        self._next_replica = (self._next_replica + 1) % len(healthy)
+        return healthy[self._next_replica]
+
+    async def replication_lag(self):
+        """Seconds this server is behind its source: None if it isn't a replica, inf if replication is stopped."""
+        async with self.acquire() as connection:
+            async with connection.cursor() as cursor:
+                try:
+                    await cursor.execute("SHOW REPLICA STATUS;")
+                except pymysql.err.ProgrammingError:
+                    # Before MySQL 8.0.22.
+                    await cursor.execute("SHOW SLAVE STATUS;")
+                row = await cursor.fetchone()
+                if row is None:
+                    return None
+                status = dict(zip([d[0] for d in cursor.description], row))
+        lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+        return math.inf if lag is None else lag
+
+    async def check_replicas(self):
+        """Connects, pings and measures the lag of every replica, updating which get reads."""
+        await asyncio.gather(*(self._check_replica(r) for r in self.replicas))
+
+    async def _watch_replicas(self):
+        while True:
+            await self.check_replicas()
+            await asyncio.sleep(REPLICA_HEALTHCHECK_INTERVAL)
+
+    async def _check_replica(self, replica):
+        async with replica.checking:
+            try:
+                if replica.database.pool is None:
+                    await asyncio.wait_for(replica.database.connect(), REPLICA_HEALTHCHECK_TIMEOUT)
+                lag = await asyncio.wait_for(replica.database.replication_lag(), REPLICA_HEALTHCHECK_TIMEOUT)
+            except Exception as e:
+                self._set_replica_health(replica, False, None, e)
+                return
+        # A server that isn't replicating from anything (lag None) is taken as
+        # caught up, which lets a plain second MySQL stand in for a replica.
+        if lag is not None and lag > REPLICA_MAX_LAG:
+            self._set_replica_health(replica, False, lag, f"{lag}s behind")
+        else:
+            self._set_replica_health(replica, True, lag)
+
+    def _set_replica_health(self, replica, healthy, lag, reason=None):
+        if healthy != replica.healthy:
+            if healthy:
+                logger.info("Read replica %s is healthy, sending reads to it", replica.name)
+            else:
+                logger.warning("Read replica %s is unavailable (%s), reads fall back to the primary",
+                               replica.name, reason)
+        replica.healthy = healthy
+        replica.lag = lag
+        db_replica_healthy.set(int(healthy), replica.name)
+        db_replica_lag.set(-1 if lag is None else lag, replica.name)
+
+    @asynccontextmanager
+    async def _checked_out(self, conn):
+        self.stats.in_use += 1
+        try:
+            yield conn
+        finally:
+            self.stats.in_use -= 1
+            # Reads leave an open transaction behind when autocommit is off and
+            # aiomysql drops connections released mid-transaction, so roll back
+            # whatever the handler didn't commit before handing it back.
+            if not conn.closed and conn.get_transaction_status():
+                try:
+                    await conn.rollback()
+                except Exception:
+                    conn.close()
+            self.pool.release(conn)
+
+    def pool_stats(self):
+        s = self.stats
+        stats = {
+            "size": self.pool.size if self.pool else 0,
+            "min_size": self.config.minsize,
+            "max_size": self.config.maxsize,
+            "in_use": s.in_use,
+            "idle": self.pool.freesize if self.pool else 0,
+            "acquired": s.acquired,
+            "timeouts": s.timeouts,
+            "failed_healthchecks": s.failed_healthchecks,
+            "wait_time_avg_ms": round(s.wait_time_total / s.acquired * 1000, 3) if s.acquired else 0.0,
+            "wait_time_max_ms": round(s.wait_time_max * 1000, 3),
+        }
+        if self.replicas:
+            stats["replicas"] = [
+                {"name": r.name, "healthy": r.healthy, "lag": r.lag, **r.database.pool_stats()}
+                for r in self.replicas
+            ]
+        return stats
+
+
+def replicas_from_env():
+    configs = []
+    for entry in filter(None, (h.strip() for h in REPLICA_HOSTS.split(","))):
+        host, _, port = entry.partition(":")
+        config = PoolConfig()
+        config.host = host
+        config.port = int(port) if port else config.port
+        configs.append(config)
+    return configs
+
+
+class ReadYourWritesMiddleware:
+    """Pure ASGI middleware keeping a client's reads on the primary just after it writes.
+
+    A successful write response carries the time until which that client
+    should read from the primary, as a cookie and as an X-Read-Primary-Until
+    header for clients that don't keep cookies. Either one sent back puts the
+    request's acquire_read() calls on the primary until then. Does nothing
+    without replicas.
+    """
+
+    cookie = "read_primary_until"
+    header = b"x-read-primary-until"
+
+    def __init__(self, app, database=None):
+        self.app = app
+        self.database = database
+
+    async def __call__(self, scope, receive, send):
+        database = self.database or db
+        if scope["type"] != "http" or not database.replicas:
+            await self.app(scope, receive, send)
+            return
+
+        writing = scope["method"] not in ("GET", "HEAD", "OPTIONS")
+
+        async def send_wrapper(message):
+            if writing and message["type"] == "http.response.start" and message["status"] < 400:
+                value = f"{time.time() + READ_YOUR_WRITES_WINDOW:.3f}"
+                cookie = (f"{self.cookie}={value}; Max-Age={math.ceil(READ_YOUR_WRITES_WINDOW)}; "
+                          "Path=/; HttpOnly; SameSite=Lax")
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"set-cookie", cookie.encode()),
+                                                  (self.header, value.encode())]}
+            await send(message)
+
+        token = _read_primary_until.set(self._client_deadline(scope["headers"]))
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _read_primary_until.reset(token)
+
+    def _client_deadline(self, headers):
+        deadline = 0.0
+        for name, value in headers:
+            candidates = []
+            if name == self.header:
+                candidates = [value.decode("latin-1")]
+            elif name == b"cookie":
+                candidates = [part.split("=", 1)[1] for part in value.decode("latin-1").split(";")
+                              if part.strip().startswith(self.cookie + "=")]
+            for candidate in candidates:
+                try:
+                    deadline = max(deadline, float(candidate))
+                except ValueError:
+                    pass
+        # Never longer than one window from now, whatever the client sends.
+        return min(deadline, time.time() + READ_YOUR_WRITES_WINDOW)
+
+
+db = Database(replicas=replicas_from_env())
+
+
+@registry.collector
+def _pool_metrics():
+    stats = db.pool_stats()
+    return [
+        ("db_pool_size", "gauge", "Open connections in the pool.", stats["size"]),
+        ("db_pool_in_use", "gauge", "Connections currently checked out.", stats["in_use"]),
+        ("db_pool_idle", "gauge", "Idle connections in the pool.", stats["idle"]),
+        ("db_pool_max_size", "gauge", "Configured maximum pool size.", stats["max_size"]),
+        ("db_pool_acquire_timeouts_total", "counter", "Checkouts that timed out waiting for a connection.", stats["timeouts"]),
+        ("db_pool_failed_healthchecks_total", "counter", "Idle connections that failed their ping.", stats["failed_healthchecks"]),
+    ]
@@ -1,15 +1,245 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
 
-import pymysql
+import asyncio
+import logging
 import os
-import random
-import string
+import time
+from contextlib import asynccontextmanager
 from datetime import date
+from typing import Literal
 
-app = FastAPI()
+import orjson
+
+from cache import cache_stats, cached_response, invalidate
+from changes import (TASK_DELETE, TASK_UPSERT, changes_since, current_change_seq, lock_lists_for_insert, record_task_change,
+                     record_task_changes)
+from db import InstrumentedSSCursor, ReadYourWritesMiddleware, db
+from events import broker
+from invites import execute_with_invite_code, forget_invite_code, invite_expiry, normalize_invite_code, resolve_invite_code
+from jobs import JOBS_ENABLED, scheduler_from_env
+from metrics import METRICS_MULTIPROCESS_DIR, MetricsMiddleware, process_uptime, registry, startup_duration
+from migrate import migrate
+from pagination import decode_cursor, encode_cursor, keyset_clause
+from schemas import (BatchCreateResult, BatchDeleteResult, BatchUpdateResult, Home, Members, SearchResults, TaskChanges,
+                     TaskPage, TaskSaved, ToDoLists)
+from search import MAX_SEARCH_PAGE_SIZE, SEARCH_MIN_WORD_LENGTH, boolean_query, search_tasks
+
+MAX_TASK_PAGE_SIZE = 500
+MAX_CHANGES_PAGE_SIZE = 1000
+MAX_BATCH_SIZE = 500
+EVENTS_HEARTBEAT_INTERVAL = float(os.getenv("EVENTS_HEARTBEAT_INTERVAL", 20))
+NDJSON_FETCH_SIZE = 1000
+READINESS_DB_TIMEOUT = float(os.getenv("READINESS_DB_TIMEOUT", 2))
+
+logger = logging.getLogger(__name__)
+
+scheduler = scheduler_from_env(db)
+
+TASK_SELECT = """
+    SELECT Task.TaskID, Task.Description, Task.Progress, User.Username AS AssigneeName, Task.DateDue, Task.DateCreated, Task.ToDoListID, Task.OwnerID 
+    FROM Task 
+    LEFT JOIN User ON Task.Assignee = User.UserID 
+"""
+
+
+def task_to_dict(t):
+    return {"id": t[0], "description": t[1], "progress": t[2], "assignee": t[3], "due_date": t[4], "created_at": t[5], "todolist_id": t[6], "owner_id": t[7]}
+
+
+SAVED_TASK_SELECT = """
+    SELECT TaskID, Description, Progress, Assignee, DateDue, DateCreated, ToDoListID, OwnerID
+    FROM Task
+"""
+
+
+USER_ID_SELECT = "SELECT UserID FROM User WHERE Username = %s;"
+MEMBERSHIP_SELECT = "SELECT * FROM ToDoListShare WHERE ToDoListID = %s AND UserID = %s;"
+JOIN_WITH_INVITE_CODE_INSERT = """
+    INSERT INTO ToDoListShare (ToDoListID, UserID)
+    SELECT ToDoListID, %s FROM ToDoList
+    WHERE ToDoListID = %s AND InviteCode = %s
+      AND (InviteExpiresAt IS NULL OR InviteExpiresAt > UTC_TIMESTAMP());
+"""
+LIST_OWNER_SELECT = """
+    SELECT User.UserID, User.Username
+    FROM User
+    JOIN ToDoList ON User.UserID = ToDoList.UserID
+    WHERE ToDoList.ToDoListID = %s;
+"""
+LIST_MEMBERS_SELECT = """
+    SELECT User.UserID, User.Username
+    FROM User
+    JOIN ToDoListShare ON User.UserID = ToDoListShare.UserID
+    WHERE ToDoListShare.ToDoListID = %s;
+"""
+# GET /home/{user_id}, formatted with one placeholder per list id.
+HOME_MEMBERS_SELECT = """
+    SELECT ToDoList.ToDoListID, User.UserID, User.Username, 'owner' AS Role
+    FROM ToDoList
+    JOIN User ON User.UserID = ToDoList.UserID
+    WHERE ToDoList.ToDoListID IN ({placeholders})
+    UNION ALL
+    SELECT ToDoListShare.ToDoListID, User.UserID, User.Username, 'member' AS Role
+    FROM ToDoListShare
+    JOIN User ON User.UserID = ToDoListShare.UserID
+    WHERE ToDoListShare.ToDoListID IN ({placeholders})
+    ORDER BY ToDoListID, Role DESC, UserID;
+"""
+HOME_COUNTS_SELECT = """
+    SELECT ToDoListID,
+           SUM(Progress = 'Completed'),
+           SUM(Progress = 'Uncompleted'),
+           SUM(Progress = 'Uncompleted' AND DateDue < CURDATE())
+    FROM Task
+    WHERE ToDoListID IN ({placeholders})
+    GROUP BY ToDoListID;
+"""
+DUE_SUMMARY_SELECT = "SELECT Overdue, DueSoon, ComputedAt FROM TaskDueRollup WHERE UserID = %s;"
+
+
+def task_list_query(todolist_id, sort="task_id", progress=None, assignee=None, due_from=None, due_to=None, after=None):
+    """Returns (sql, params) for a list's tasks in `sort` order, without a LIMIT.
+
+    `after` is a decoded (sort key, task id) cursor to resume from.
+    """
+    conditions = ["Task.ToDoListID = %s"]
+    params = [todolist_id]
+    if progress is not None:
+        conditions.append("Task.Progress = %s")
+        params.append(progress)
+    if assignee is not None:
+        conditions.append("Task.Assignee = %s")
+        params.append(assignee)
+    if due_from is not None:
+        conditions.append("Task.DateDue >= %s")
+        params.append(due_from)
+    if due_to is not None:
+        conditions.append("Task.DateDue <= %s")
+        params.append(due_to)
+    if after is not None:
+        clause, clause_params = keyset_clause(sort, *after)
+        conditions.append(clause)
+        params.extend(clause_params)
+
+    order_by = "Task.TaskID" if sort == "task_id" else "Task.DateDue, Task.TaskID"
+    sql = TASK_SELECT + f"""
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {order_by}
+    """
+    return sql, params
+
+
+async def _fetch_saved_task(cursor, task_id):
+    """The task as stored, with the assignee's user id rather than username."""
+    await cursor.execute(SAVED_TASK_SELECT + "WHERE TaskID = %s", (task_id,))
+    return task_to_dict(await cursor.fetchone())
+
+
+async def _fetch_saved_tasks(cursor, task_ids):
+    """Batch form of _fetch_saved_task: {task id: task dict}."""
+    placeholders = ", ".join(["%s"] * len(task_ids))
+    await cursor.execute(SAVED_TASK_SELECT + f"WHERE TaskID IN ({placeholders});", tuple(task_ids))
+    return {t[0]: task_to_dict(t) for t in await cursor.fetchall()}
+
+
+async def _fetch_tasks_by_id(cursor, task_ids):
+    placeholders = ", ".join(["%s"] * len(task_ids))
+    await cursor.execute(TASK_SELECT + f"WHERE Task.TaskID IN ({placeholders}) ORDER BY Task.TaskID;", tuple(task_ids))
+    return {t[0]: t for t in await cursor.fetchall()}
+
+
+async def _stream_tasks(sql, params):
+    """Yields NDJSON chunks for the rows of a TASK_SELECT query, reading them unbuffered."""
+    async with db.acquire_read() as connection:
+        cursor = await connection.cursor(InstrumentedSSCursor)
+        try:
+            await cursor.execute(sql, params)
+            while True:
+                rows = await cursor.fetchmany(NDJSON_FETCH_SIZE)
+                if not rows:
+                    break
+                yield b"".join(orjson.dumps(task_to_dict(t), option=orjson.OPT_APPEND_NEWLINE) for t in rows)
+            await cursor.close()
+        except BaseException:
+            # Client gone or the read failed: closing the connection is cheaper
+            # than draining the rest of an unbuffered result.
+            connection.close()
+            raise
+
+
+async def _load_task_changes(cursor, todolist_id, since, limit):
+    latest, token, has_more = await changes_since(cursor, todolist_id, since, limit)
+    upserted = [task_id for task_id, change in latest.items() if change == TASK_UPSERT]
+    rows = await _fetch_tasks_by_id(cursor, upserted) if upserted else {}
+    # An upsert whose row is gone was deleted after this page's last change;
+    # report it as deleted so clients never keep a task that no longer exists.
+    deleted = [task_id for task_id, change in latest.items() if change == TASK_DELETE or task_id not in rows]
+    return list(rows.values()), deleted, token, has_more
+
+
+async def _task_changes_committed(cursor, changes):
+    """Invalidates cached task reads and pushes committed (todolist_id, task_id, seq, change_type)
+    changes to WebSocket subscribers."""
+    await invalidate(*{f"tasks:{todolist_id}" for todolist_id, _, _, _ in changes})
+    try:
+        upserted = [task_id for _, task_id, _, change in changes if change == TASK_UPSERT]
+        rows = await _fetch_tasks_by_id(cursor, upserted) if upserted else {}
+        for todolist_id, task_id, seq, change in changes:
+            event = {"todolist_id": todolist_id, "seq": seq}
+            if change == TASK_DELETE:
+                event.update(type="task.deleted", task_id=task_id)
+            elif task_id in rows:
+                event.update(type="task.upserted", task=jsonable_encoder(task_to_dict(rows[task_id])))
+            else:
+                # Deleted again before we could read it; its own delete event follows.
+                continue
+            await broker.publish(event)
+    except Exception:
+        # The change is committed either way; subscribers catch up when they resume.
+        logger.exception("Failed to publish task changes")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    phases = [("db_connect", db.connect), ("broker", broker.start)]
+    if os.getenv("DB_MIGRATE_ON_STARTUP", "1") == "1":
+        phases.insert(1, ("migrate", lambda: migrate(db)))
+    if JOBS_ENABLED:
+        phases.append(("scheduler", scheduler.start))
+    for name, start in phases:
+        began = time.perf_counter()
+        await start()
+        startup_duration.set(time.perf_counter() - began, name)
+    total = process_uptime()
+    if total is not None:
+        startup_duration.set(total, "total")
+        logger.info("Ready %.2fs after process start", total)
+    app.state.ready = True
+    metrics_sync = asyncio.create_task(registry.sync_snapshots()) if METRICS_MULTIPROCESS_DIR else None
+    try:
+        yield
+    finally:
+        # By now the server has stopped accepting requests and waited for
+        # in-flight ones; db.close() waits for their connections to come back.
+        app.state.ready = False
+        await scheduler.stop()
+        await broker.stop()
+        await db.close()
+        if metrics_sync is not None:
+            metrics_sync.cancel()
+            try:
+                await metrics_sync
+            except asyncio.CancelledError:
+                pass
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.state.ready = False
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,10 +247,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Read-Primary-Until"],
 )
-
-def generate_invite_code():
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 class TaskCreate(BaseModel):
     description: str
@@ -36,6 +266,12 @@ class TaskUpdate(BaseModel):
     due_date: date | None = None
     progress: str | None = None 
 
+class TaskBatchUpdate(TaskUpdate):
+    id: int
+
+class TaskBatchDelete(BaseModel):
+    task_ids: list[int]
+
 class LeaveListRequest(BaseModel):
     user_id: int
     
@@ -44,125 +280,152 @@ class LeaveListRequest(BaseModel):
     
 
 
-def get_db_connection():
-    return pymysql.connect(
-        host = 'mysql',
-        user = 'root',
-        password = os.getenv("MYSQL_ROOT_PASSWORD"),
-        database = 'tododb',
-        port=3306
-    )
-        
-        
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+# Per worker, unlike /metrics: "worker" says which process answered.
+@app.get("/stats/db-pool")
+async def get_db_pool_stats():
+    return {**db.pool_stats(), "worker": os.getpid()}
+
+
+@app.get("/stats/cache")
+async def get_cache_stats():
+    return {**cache_stats(), "worker": os.getpid()}
+
+
+@app.get("/healthz")
+async def healthz():
+    # Liveness only: a database outage shouldn't get every pod restarted.
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    if not app.state.ready:
+        return ORJSONResponse({"status": "not_ready", "database": None}, status_code=503)
+    try:
+        await db.ping(READINESS_DB_TIMEOUT)
+    except Exception as e:
+        return ORJSONResponse({"status": "unavailable", "database": str(e) or type(e).__name__}, status_code=503)
+    return {"status": "ready", "database": "ok"}
+
+
 @app.get("/users")
-def get_users():
+async def get_users():
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT UserID, Username FROM User;")
-            users = cursor.fetchall()
-        connection.close()
+        async with db.acquire_read() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute("SELECT UserID, Username FROM User;")
+                users = await cursor.fetchall()
         return {"users": [{"UserID": u[0], "Username": u[1]} for u in users]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/register")
-def register_user(username: str):
-    connection = get_db_connection()
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT UserID FROM User WHERE Username = %s;", (username,))
-            existing_user = cursor.fetchone()
+async def register_user(username: str):
+    async with db.acquire() as connection:
+        try:
+            async with connection.cursor() as cursor:
+                await cursor.execute(USER_ID_SELECT, (username,))
+                existing_user = await cursor.fetchone()
 
-            if existing_user:
-                return {"success": False, "message": "Username already exists"}
+                if existing_user:
+                    return {"success": False, "message": "Username already exists"}
 
-            cursor.execute("INSERT INTO User (Username) VALUES (%s);", (username,))
-            connection.commit()
+                await cursor.execute("INSERT INTO User (Username) VALUES (%s);", (username,))
+                await connection.commit()
 
-            user_id = cursor.lastrowid
+                user_id = cursor.lastrowid
 
-        return {"success": True, "user_id": user_id, "message": "Registration successful"}
-    
-    except Exception as e:
-        connection.rollback()  
-        raise HTTPException(status_code=500, detail=f"Error during registration: {str(e)}")
+            return {"success": True, "user_id": user_id, "message": "Registration successful"}
 
-    finally:
-        connection.close()  
+        except Exception as e:
+            await connection.rollback()
+            raise HTTPException(status_code=500, detail=f"Error during registration: {str(e)}")
 
 
 @app.post("/login")
-def login_user(username: str):
-    connection = get_db_connection()
+async def login_user(username: str):
     try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT UserID FROM User WHERE Username = %s;", (username,))
-            user = cursor.fetchone()
+        async with db.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(USER_ID_SELECT, (username,))
+                user = await cursor.fetchone()
 
         if user:
             return {"success": True, "user_id": user[0], "message": "Login successful"}
         else:
             return {"success": False, "message": "User not found"}
-    
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during login: {str(e)}")
 
-    finally:
-        connection.close()  
 
 
 
 
 
+VISIBLE_LISTS_SELECT = """
+    SELECT ToDoListID, Name, SharedFlag, UserID, InviteCode, 0 AS Shared
+    FROM ToDoList
+    WHERE UserID = %s
+    UNION ALL
+    SELECT ToDoList.ToDoListID, ToDoList.Name, ToDoList.SharedFlag, ToDoList.UserID, ToDoList.InviteCode, 1 AS Shared
+    FROM ToDoList
+    JOIN ToDoListShare ON ToDoList.ToDoListID = ToDoListShare.ToDoListID
+    WHERE ToDoListShare.UserID = %s AND ToDoList.UserID != %s
+    ORDER BY Shared, ToDoListID;
+"""
+
+
+async def _visible_lists(cursor, user_id):
+    """Owned lists first, then lists shared with the user, in one round trip."""
+    await cursor.execute(VISIBLE_LISTS_SELECT, (user_id, user_id, user_id))
+    return await cursor.fetchall()
+
+
+def todolist_to_dict(l):
+    return {"id": l[0], "name": l[1], "shared": bool(l[2]), "owner_id": l[3], "inviteCode": l[4]}
+
+
+@app.get("/todolists/{user_id}", response_model=ToDoLists)
+async def get_todolists(user_id: int, request: Request):
+    async def load(fresh):
+        async with db.acquire_read(fresh) as connection:
+            async with connection.cursor() as cursor:
+                lists = await _visible_lists(cursor, user_id)
+
+        return {"todolists": [todolist_to_dict(l) for l in lists]}
 
-@app.get("/todolists/{user_id}")
-def get_todolists(user_id: int):
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            
-            cursor.execute("""
-                SELECT ToDoListID, Name, SharedFlag, UserID, InviteCode 
-                FROM ToDoList 
-                WHERE UserID = %s;
-            """, (user_id,))
-            owned_lists = cursor.fetchall()
-            
-            cursor.execute("""
-                SELECT ToDoList.ToDoListID, ToDoList.Name, ToDoList.SharedFlag, ToDoList.UserID, ToDoList.InviteCode 
-                FROM ToDoList 
-                JOIN ToDoListShare ON ToDoList.ToDoListID = ToDoListShare.ToDoListID 
-                WHERE ToDoListShare.UserID = %s AND ToDoList.UserID != %s;
-            """, (user_id, user_id))
-            shared_lists = cursor.fetchall()
-            
-        connection.close()
-        
-        todolists = [
-            {"id": l[0], "name": l[1], "shared": bool(l[2]), "owner_id": l[3], "inviteCode": l[4]}
-            for l in owned_lists + shared_lists
-        ]
-        
-        return {"todolists": todolists}
+        return await cached_response(request, f"todolists:{user_id}", "", load)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
     
 @app.post("/todolists")
-def create_todolist(user_id: int, shared: int, name: str):
+async def create_todolist(user_id: int, shared: int, name: str, invite_ttl_hours: int | None = Query(None, ge=1)):
     try:
-        connection = get_db_connection()
-        invite_code = generate_invite_code() if shared == 1 else None
+        invite_code = None
 
-        with connection.cursor() as cursor:
-            cursor.execute("INSERT INTO ToDoList (SharedFlag, UserID, Name, InviteCode) VALUES (%s, %s, %s, %s);",
-                           (shared, user_id, name, invite_code))
-            connection.commit()
-            todolist_id = cursor.lastrowid
-        connection.close()
+        async with db.acquire() as connection:
+            async with connection.cursor() as cursor:
+                if shared == 1:
+                    invite_code = await execute_with_invite_code(
+                        cursor,
+                        "INSERT INTO ToDoList (SharedFlag, UserID, Name, InviteExpiresAt, InviteCode) VALUES (%s, %s, %s, %s, %s);",
+                        lambda code: (shared, user_id, name, invite_expiry(invite_ttl_hours), code))
+                else:
+                    await cursor.execute("INSERT INTO ToDoList (SharedFlag, UserID, Name, InviteCode) VALUES (%s, %s, %s, %s);",
+                                         (shared, user_id, name, invite_code))
+                await connection.commit()
+                todolist_id = cursor.lastrowid
+        await invalidate(f"todolists:{user_id}")
 
         return {
             "message": "Todo list successfully created!",
@@ -176,52 +439,110 @@ def create_todolist(user_id: int, shared: int, name: str):
 
     
 @app.post("/todolists/join")
-def join_todolist(user_id: int, invite_code: str):
+async def join_todolist(user_id: int, invite_code: str):
+    invite_code = normalize_invite_code(invite_code)
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT ToDoListID FROM ToDoList WHERE InviteCode = %s;", (invite_code,))
-            todolist = cursor.fetchone()
-            if not todolist:
-                raise HTTPException(status_code=404, detail="Invite code not found")
-            todolist_id = todolist[0]
-
-            cursor.execute("SELECT * FROM ToDoListShare WHERE ToDoListID = %s AND UserID = %s;", (todolist_id, user_id))
-            existing = cursor.fetchone()
-            if existing:
-                return {"message": "User already in the list"}
-
-            cursor.execute("INSERT INTO ToDoListShare (ToDoListID, UserID) VALUES (%s, %s);", (todolist_id, user_id))
-            connection.commit()
-        connection.close()
+        async with db.acquire() as connection:
+            async with connection.cursor() as cursor:
+                todolist_id = await resolve_invite_code(cursor, invite_code)
+                if todolist_id is None:
+                    raise HTTPException(status_code=404, detail="Invite code not found")
+
+                await cursor.execute(MEMBERSHIP_SELECT, (todolist_id, user_id))
+                existing = await cursor.fetchone()
+                if existing:
+                    return {"message": "User already in the list"}
+
+                # Re-checks the code in the same statement, so a code that was
+                # revoked or expired after it was cached can't be used to join.
+                await cursor.execute(JOIN_WITH_INVITE_CODE_INSERT, (user_id, todolist_id, invite_code))
+                if cursor.rowcount == 0:
+                    await forget_invite_code(invite_code)
+                    raise HTTPException(status_code=404, detail="Invite code not found")
+                await connection.commit()
+        await invalidate(f"todolists:{user_id}", f"members:{todolist_id}")
         return {"message": "User successfully added to the list"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
-@app.get("/todolists/{todolist_id}/users")
-def get_users_with_access(todolist_id: int):
+
+
+LIST_USER_IDS_SELECT = """
+    SELECT UserID FROM ToDoList WHERE ToDoListID = %s
+    UNION
+    SELECT UserID FROM ToDoListShare WHERE ToDoListID = %s;
+"""
+
+
+async def _list_user_ids(cursor, todolist_id):
+    await cursor.execute(LIST_USER_IDS_SELECT, (todolist_id, todolist_id))
+    return [row[0] for row in await cursor.fetchall()]
+
+
+async def _owned_invite_code(cursor, todolist_id, user_id):
+    await cursor.execute("SELECT UserID, InviteCode FROM ToDoList WHERE ToDoListID = %s FOR UPDATE;", (todolist_id,))
+    todolist = await cursor.fetchone()
+    if not todolist:
+        raise HTTPException(status_code=404, detail="Todo list not found")
+    if todolist[0] != user_id:
+        raise HTTPException(status_code=403, detail="Only the list owner can manage its invite code")
+    return todolist[1]
+
+
+@app.post("/todolists/{todolist_id}/invite-code")
+async def regenerate_invite_code(todolist_id: int, user_id: int, ttl_hours: int | None = Query(None, ge=1)):
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            
-            cursor.execute("""
-                SELECT User.UserID, User.Username 
-                FROM User 
-                JOIN ToDoList ON User.UserID = ToDoList.UserID 
-                WHERE ToDoList.ToDoListID = %s;
-            """, (todolist_id,))
-            owner = cursor.fetchone()
-            
-            cursor.execute("""
-                SELECT User.UserID, User.Username 
-                FROM User 
-                JOIN ToDoListShare ON User.UserID = ToDoListShare.UserID 
-                WHERE ToDoListShare.ToDoListID = %s;
-            """, (todolist_id,))
-            shared_users = cursor.fetchall()
-            
-        connection.close()
-        
+        async with db.acquire() as connection:
+            async with connection.cursor() as cursor:
+                old_code = await _owned_invite_code(cursor, todolist_id, user_id)
+                expires_at = invite_expiry(ttl_hours)
+                invite_code = await execute_with_invite_code(
+                    cursor,
+                    "UPDATE ToDoList SET SharedFlag = 1, InviteExpiresAt = %s, InviteCode = %s WHERE ToDoListID = %s;",
+                    lambda code: (expires_at, code, todolist_id))
+                user_ids = await _list_user_ids(cursor, todolist_id)
+                await connection.commit()
+        await forget_invite_code(old_code)
+        await invalidate(*[f"todolists:{u}" for u in user_ids])
+        return {"inviteCode": invite_code, "expires_at": expires_at}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.delete("/todolists/{todolist_id}/invite-code")
+async def revoke_invite_code(todolist_id: int, user_id: int):
+    try:
+        async with db.acquire() as connection:
+            async with connection.cursor() as cursor:
+                old_code = await _owned_invite_code(cursor, todolist_id, user_id)
+                await cursor.execute(
+                    "UPDATE ToDoList SET InviteCode = NULL, InviteExpiresAt = NULL WHERE ToDoListID = %s;", (todolist_id,))
+                user_ids = await _list_user_ids(cursor, todolist_id)
+                await connection.commit()
+        await forget_invite_code(old_code)
+        await invalidate(*[f"todolists:{u}" for u in user_ids])
+        return {"message": "Invite code revoked"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    
+@app.get("/todolists/{todolist_id}/users", response_model=Members)
+async def get_users_with_access(todolist_id: int, request: Request):
+    async def load(fresh):
+        async with db.acquire_read(fresh) as connection:
+            async with connection.cursor() as cursor:
+
+                await cursor.execute(LIST_OWNER_SELECT, (todolist_id,))
+                owner = await cursor.fetchone()
+
+                await cursor.execute(LIST_MEMBERS_SELECT, (todolist_id,))
+                shared_users = await cursor.fetchall()
+
         users_with_access = []
         
         if owner:
@@ -231,141 +552,584 @@ def get_users_with_access(todolist_id: int):
                                   for u in shared_users])
         
         return {"users": users_with_access}
-            
+
+    try:
+        return await cached_response(request, f"members:{todolist_id}", "", load)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
     
-@app.get("/tasks/{todolist_id}")
-def get_tasks(todolist_id: int):
+@app.get("/home/{user_id}", response_model=Home)
+async def get_home(
+    user_id: int,
+    todolist_id: int | None = None,
+    task_limit: int = Query(50, ge=1, le=MAX_TASK_PAGE_SIZE),
+):
+    # Everything the app needs on a cold start in one request: the user's lists
+    # with members and task counts, plus the first page of tasks for
+    # `todolist_id` if given. Replaces GET /todolists/{user_id} followed by
+    # /tasks/{id} and /todolists/{id}/users for each list.
+    try:
+        async with db.acquire_read() as connection:
+            async with connection.cursor() as cursor:
+                lists = await _visible_lists(cursor, user_id)
+                list_ids = [l[0] for l in lists]
+                if todolist_id is not None and todolist_id not in list_ids:
+                    raise HTTPException(status_code=404, detail="Todo list not found")
+
+                members = {}
+                counts = {}
+                if list_ids:
+                    placeholders = ", ".join(["%s"] * len(list_ids))
+                    await cursor.execute(HOME_MEMBERS_SELECT.format(placeholders=placeholders), (*list_ids, *list_ids))
+                    for list_id, member_id, username, role in await cursor.fetchall():
+                        members.setdefault(list_id, []).append({"id": member_id, "username": username, "role": role})
+
+                    await cursor.execute(HOME_COUNTS_SELECT.format(placeholders=placeholders), tuple(list_ids))
+                    for list_id, completed, uncompleted, overdue in await cursor.fetchall():
+                        counts[list_id] = {"completed": int(completed or 0), "uncompleted": int(uncompleted or 0),
+                                           "overdue": int(overdue or 0),
+                                           "total": int(completed or 0) + int(uncompleted or 0)}
+
+                # Precomputed by the due_rollup job; null until it has counted anything for this user.
+                await cursor.execute(DUE_SUMMARY_SELECT, (user_id,))
+                rollup = await cursor.fetchone()
+                due = {"overdue": rollup[0], "due_soon": rollup[1], "computed_at": rollup[2]} if rollup else None
+
+                tasks = None
+                if todolist_id is not None:
+                    sync_token = await current_change_seq(cursor, todolist_id)
+                    sql, params = task_list_query(todolist_id)
+                    await cursor.execute(sql + " LIMIT %s", (*params, task_limit + 1))
+                    rows = await cursor.fetchall()
+                    next_cursor = None
+                    if len(rows) > task_limit:
+                        rows = rows[:task_limit]
+                        next_cursor = encode_cursor("task_id", rows[-1][0], rows[-1][0])
+                    tasks = {"todolist_id": todolist_id, "tasks": [task_to_dict(t) for t in rows],
+                             "next_cursor": next_cursor, "sync_token": sync_token}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    empty_counts = {"completed": 0, "uncompleted": 0, "overdue": 0, "total": 0}
+    return {
+        "todolists": [
+            {**todolist_to_dict(l), "members": members.get(l[0], []), "counts": counts.get(l[0], empty_counts)}
+            for l in lists
+        ],
+        "tasks": tasks,
+        "due": due,
+    }
+
+
+@app.get("/search/{user_id}", response_model=SearchResults)
+async def search_user_tasks(
+    user_id: int,
+    q: str = Query(..., min_length=1, max_length=200),
+    todolist_id: int | None = None,
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_PAGE_SIZE),
+    cursor: str | None = None,
+):
+    query = boolean_query(q)
+    if query is None:
+        raise HTTPException(status_code=400, detail=f"Search needs a word of at least {SEARCH_MIN_WORD_LENGTH} characters")
+
+    try:
+        async with db.acquire_read() as connection:
+            async with connection.cursor() as cur:
+                rows, next_cursor = await search_tasks(cur, user_id, query, limit, cursor, todolist_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "tasks": [{**task_to_dict(t), "score": t[8]} for t in rows],
+        "next_cursor": next_cursor,
+    }
+
+
+@app.get("/tasks/{todolist_id}", response_model=TaskPage)
+async def get_tasks(
+    todolist_id: int,
+    request: Request,
+    limit: int | None = Query(None, ge=1, le=MAX_TASK_PAGE_SIZE),
+    cursor: str | None = None,
+    sort: Literal["task_id", "due_date"] = "task_id",
+    progress: str | None = None,
+    assignee: int | None = None,
+    due_from: date | None = None,
+    due_to: date | None = None,
+    output: Literal["json", "ndjson"] = Query("json", alias="format"),
+):
+    # Without a limit the whole list is returned, as older clients expect.
+    # format=ndjson streams one task per line instead, for lists too large to
+    # build as a single response.
+    if progress is not None and progress not in ["Uncompleted", "Completed"]:
+        raise HTTPException(status_code=400, detail="Invalid progress value")
+
+    after = None
+    if cursor is not None:
+        try:
+            after = decode_cursor(cursor, sort)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    sql, params = task_list_query(todolist_id, sort, progress, assignee, due_from, due_to, after)
+    if output == "ndjson":
+        if limit is not None:
+            sql += " LIMIT %s"
+            params.append(limit)
+        return StreamingResponse(_stream_tasks(sql, tuple(params)), media_type="application/x-ndjson")
+    if limit is not None:
+        # Fetch one extra row to know whether another page exists.
+        sql += " LIMIT %s"
+        params.append(limit + 1)
+
+    async def load(fresh):
+        async with db.acquire_read(fresh) as connection:
+            async with connection.cursor() as cur:
+                # Read in the same snapshot as the tasks so the token matches them.
+                sync_token = await current_change_seq(cur, todolist_id)
+                await cur.execute(sql, tuple(params))
+                tasks = await cur.fetchall()
+
+        next_cursor = None
+        if limit is not None and len(tasks) > limit:
+            tasks = tasks[:limit]
+            last = tasks[-1]
+            next_cursor = encode_cursor(sort, last[0] if sort == "task_id" else last[4], last[0])
+
+        return {
+            "tasks": [task_to_dict(t) for t in tasks],
+            "next_cursor": next_cursor,
+            "sync_token": sync_token,
+        }
+
+    # Every filter/page combination is cached separately under the list's group.
+    key = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    try:
+        return await cached_response(request, f"tasks:{todolist_id}", key, load)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/tasks/{todolist_id}/changes", response_model=TaskChanges)
+async def get_task_changes(
+    todolist_id: int,
+    since: int = Query(..., ge=0),
+    limit: int = Query(MAX_CHANGES_PAGE_SIZE, ge=1, le=MAX_CHANGES_PAGE_SIZE),
+):
+    # `since` is the sync_token from GET /tasks/{todolist_id} or a previous call.
+    # A 404 means the list itself was deleted and the client should drop it.
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT Task.TaskID, Task.Description, Task.Progress, User.Username AS AssigneeName, Task.DateDue, Task.DateCreated, Task.ToDoListID, Task.OwnerID 
-                FROM Task 
-                LEFT JOIN User ON Task.Assignee = User.UserID 
-                WHERE Task.ToDoListID = %s;
-            """, (todolist_id,))
-            tasks = cursor.fetchall()
-        connection.close()
-        return {"tasks": [{"id": t[0], "description": t[1], "progress": t[2], "assignee": t[3], "due_date": t[4], "created_at": t[5], "todolist_id": t[6], "owner_id": t[7]} for t in tasks]}
+        async with db.acquire() as connection:
+            async with connection.cursor() as cursor:
+                current = await current_change_seq(cursor, todolist_id)
+                if current is None:
+                    raise HTTPException(status_code=404, detail="Todo list not found")
+                if since > current:
+                    raise HTTPException(status_code=400, detail="Sync token is ahead of the list")
+
+                changed, deleted, token, has_more = await _load_task_changes(cursor, todolist_id, since, limit)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    return {
+        "changed": [task_to_dict(t) for t in changed],
+        "deleted": deleted,
+        "sync_token": token,
+        "has_more": has_more,
+    }
+
+
+@app.websocket("/ws/todolists/{todolist_id}")
+async def todolist_events(websocket: WebSocket, todolist_id: int, since: int | None = None):
+    # Streams task.upserted / task.deleted / list.deleted events for one list.
+    # Clients reconnect with since=<last seq they saw> and first receive a "sync"
+    # message with everything they missed, then live events again.
+    await websocket.accept()
+    # Subscribe before reading the change log so nothing slips in between;
+    # anything delivered twice or late is skipped by its sequence number, and a
+    # gap in the sequence is filled from the change log.
+    sub = broker.subscribe(todolist_id)
+
+    async def sync(last_seq):
+        # Sends everything after last_seq as "sync" messages; returns the new
+        # last seq, or None once the list is gone.
+        has_more = True
+        while has_more:
+            async with db.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    current = await current_change_seq(cursor, todolist_id)
+                    if current is None:
+                        return None
+                    if last_seq is None or last_seq > current:
+                        changed, deleted, has_more = [], [], False
+                        last_seq = current
+                    else:
+                        changed, deleted, last_seq, has_more = await _load_task_changes(
+                            cursor, todolist_id, last_seq, MAX_CHANGES_PAGE_SIZE)
+            await websocket.send_json(jsonable_encoder({
+                "type": "sync", "todolist_id": todolist_id, "seq": last_seq,
+                "changed": [task_to_dict(t) for t in changed], "deleted": deleted,
+            }))
+        return last_seq
+
+    try:
+        last_seq = await sync(since)
+        if last_seq is None:
+            await websocket.close(code=4404, reason="Todo list not found")
+            return
+
+        while True:
+            try:
+                event = await asyncio.wait_for(sub.queue.get(), EVENTS_HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                await websocket.send_json({"type": "heartbeat", "seq": last_seq})
+                continue
+            if event is None:
+                await websocket.close(code=4008, reason=f"Too far behind, reconnect with since={last_seq}")
+                return
+            if event.get("seq") is not None:
+                if event["seq"] > last_seq + 1:
+                    # Writers publish after they commit, so events can arrive out
+                    # of order: fill the gap from the change log, which this
+                    # event's own change is already in.
+                    last_seq = await sync(last_seq)
+                    if last_seq is None:
+                        await websocket.close(code=4404, reason="Todo list not found")
+                        return
+                if event["seq"] <= last_seq:
+                    continue
+                last_seq = event["seq"]
+            await websocket.send_json(event)
+            if event["type"] == "list.deleted":
+                await websocket.close()
+                return
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broker.unsubscribe(sub)
+
     
-@app.post("/tasks")
-def create_task(task: TaskCreate):
+@app.post("/tasks", response_model=TaskSaved)
+async def create_task(task: TaskCreate):
+    try:
+        async with db.acquire() as connection:
+            async with connection.cursor() as cursor:
+                sql = """
+                    INSERT INTO Task (Description, Progress, Assignee, DateDue, ToDoListID, OwnerID)
+                    VALUES (%s, %s, %s, %s, %s, %s);
+                """
+                values = (
+                    task.description,
+                    task.progress if task.progress else "Uncompleted",
+                    task.assignee if task.assignee is not None else None,
+                    task.due_date if task.due_date else None,
+                    task.todolist_id,
+                    task.owner_id
+                )
+
+                await lock_lists_for_insert(cursor, [task.todolist_id])
+                await cursor.execute(sql, values)
+                task_id = cursor.lastrowid
+                seq = await record_task_change(cursor, task.todolist_id, task_id, TASK_UPSERT)
+                await connection.commit()
+                await _task_changes_committed(cursor, [(task.todolist_id, task_id, seq, TASK_UPSERT)])
+
+                new_task = await _fetch_saved_task(cursor, task_id)
+
+        return {"message": "Task created successfully", "task": new_task}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+TASK_UPDATE_COLUMNS = {"description": "Description", "assignee": "Assignee", "due_date": "DateDue", "progress": "Progress"}
+
+
+def _batch_error(status_code, errors):
+    raise HTTPException(status_code=status_code, detail={"message": "Batch rejected, no changes applied", "errors": errors})
+
+
+async def _task_lists(cursor, task_ids):
+    placeholders = ", ".join(["%s"] * len(task_ids))
+    await cursor.execute(f"SELECT TaskID, ToDoListID FROM Task WHERE TaskID IN ({placeholders}) FOR UPDATE;", tuple(task_ids))
+    return dict(await cursor.fetchall())
+
+
+async def _existing_users(cursor, user_ids):
+    # Share-locked so none of them can be deleted before the INSERT that references them.
+    ids = sorted(set(user_ids))
+    placeholders = ", ".join(["%s"] * len(ids))
+    await cursor.execute(f"SELECT UserID FROM User WHERE UserID IN ({placeholders}) FOR SHARE;", tuple(ids))
+    return {row[0] for row in await cursor.fetchall()}
+
+
+async def _record_changes_by_list(cursor, task_lists, change_type):
+    by_list = {}
+    for task_id, todolist_id in task_lists.items():
+        by_list.setdefault(todolist_id, []).append(task_id)
+    # Lock list rows in a fixed order so concurrent batches can't deadlock.
+    changes = []
+    for todolist_id in sorted(by_list):
+        seqs = await record_task_changes(cursor, todolist_id, by_list[todolist_id], change_type)
+        changes.extend((todolist_id, task_id, seq, change_type) for task_id, seq in zip(by_list[todolist_id], seqs))
+    return changes
+
+
+@app.post("/tasks/batch", response_model=BatchCreateResult)
+async def create_tasks_batch(tasks: list[TaskCreate]):
+    if not tasks or len(tasks) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch must contain between 1 and {MAX_BATCH_SIZE} tasks")
+    errors = [{"index": i, "error": "Invalid progress value"}
+              for i, t in enumerate(tasks) if t.progress not in ["Uncompleted", "Completed"]]
+    if errors:
+        _batch_error(400, errors)
+
+    try:
+        async with db.acquire() as connection:
+            async with connection.cursor() as cursor:
+                values = []
+                for t in tasks:
+                    values.extend((t.description, t.progress, t.assignee, t.due_date, t.todolist_id, t.owner_id))
+                placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(tasks))
+                lists = await lock_lists_for_insert(cursor, [t.todolist_id for t in tasks])
+                users = await _existing_users(
+                    cursor, [t.owner_id for t in tasks] + [t.assignee for t in tasks if t.assignee is not None])
+                missing = []
+                for i, t in enumerate(tasks):
+                    if t.todolist_id not in lists:
+                        missing.append({"index": i, "todolist_id": t.todolist_id, "error": "Todo list not found"})
+                    if t.owner_id not in users:
+                        missing.append({"index": i, "owner_id": t.owner_id, "error": "Owner not found"})
+                    if t.assignee is not None and t.assignee not in users:
+                        missing.append({"index": i, "assignee": t.assignee, "error": "Assignee not found"})
+                if missing:
+                    _batch_error(404, missing)
+
+                await cursor.execute(f"""
+                    INSERT INTO Task (Description, Progress, Assignee, DateDue, ToDoListID, OwnerID)
+                    VALUES {placeholders};
+                """, tuple(values))
+                # A multi-row INSERT gets ascending ids from lastrowid on, but not
+                # necessarily consecutive ones (auto_increment_increment), so read
+                # them back. The list locks keep anyone else's rows out of the range.
+                list_ids = sorted({t.todolist_id for t in tasks})
+                await cursor.execute(f"""
+                    SELECT TaskID FROM Task
+                    WHERE TaskID >= %s AND ToDoListID IN ({", ".join(["%s"] * len(list_ids))})
+                    ORDER BY TaskID LIMIT %s;
+                """, (cursor.lastrowid, *list_ids, len(tasks)))
+                task_ids = [row[0] for row in await cursor.fetchall()]
+                if len(task_ids) != len(tasks):
+                    raise RuntimeError("Could not read back the ids of the created tasks")
+                changes = await _record_changes_by_list(
+                    cursor, {task_id: t.todolist_id for task_id, t in zip(task_ids, tasks)}, TASK_UPSERT)
+                await connection.commit()
+
+                created = await _fetch_saved_tasks(cursor, task_ids)
+                await _task_changes_committed(cursor, changes)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {"message": f"{len(tasks)} tasks created successfully", "results": [
+        {"index": i, "status": "created", "task": created[task_id]}
+        for i, task_id in enumerate(task_ids)
+    ]}
+
+
+@app.patch("/tasks/batch", response_model=BatchUpdateResult)
+async def update_tasks_batch(updates: list[TaskBatchUpdate]):
+    if not updates or len(updates) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch must contain between 1 and {MAX_BATCH_SIZE} tasks")
+    errors = []
+    changes = []
+    for i, u in enumerate(updates):
+        fields = u.model_dump(exclude={"id"}, exclude_none=True)
+        if not fields:
+            errors.append({"index": i, "id": u.id, "error": "No fields to update"})
+        elif fields.get("progress", "Uncompleted") not in ["Uncompleted", "Completed"]:
+            errors.append({"index": i, "id": u.id, "error": "Invalid progress value"})
+        changes.append(fields)
+    if len({u.id for u in updates}) != len(updates):
+        errors.append({"error": "Each task may appear only once per batch"})
+    if errors:
+        _batch_error(400, errors)
+
+    try:
+        async with db.acquire() as connection:
+            async with connection.cursor() as cursor:
+                task_ids = [u.id for u in updates]
+                task_lists = await _task_lists(cursor, task_ids)
+                missing = [{"index": i, "id": task_id, "error": "Task not found"}
+                           for i, task_id in enumerate(task_ids) if task_id not in task_lists]
+                if missing:
+                    _batch_error(404, missing)
+
+                # Items touching the same columns share one UPDATE ... CASE statement,
+                # so "complete all" is a single statement however many tasks it covers.
+                groups = {}
+                for task_id, fields in zip(task_ids, changes):
+                    groups.setdefault(tuple(sorted(fields)), []).append((task_id, fields))
+                for columns, items in groups.items():
+                    set_clauses = []
+                    params = []
+                    for column in columns:
+                        set_clauses.append(f"{TASK_UPDATE_COLUMNS[column]} = CASE TaskID "
+                                           + "WHEN %s THEN %s " * len(items) + "END")
+                        for task_id, fields in items:
+                            params.extend((task_id, fields[column]))
+                    ids = [task_id for task_id, _ in items]
+                    params.extend(ids)
+                    await cursor.execute(
+                        f"UPDATE Task SET {', '.join(set_clauses)} WHERE TaskID IN ({', '.join(['%s'] * len(ids))});",
+                        tuple(params))
+                changes = await _record_changes_by_list(cursor, task_lists, TASK_UPSERT)
+                await connection.commit()
+
+                updated = await _fetch_saved_tasks(cursor, task_ids)
+                await _task_changes_committed(cursor, changes)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {"message": f"{len(updates)} tasks updated successfully", "results": [
+        {"index": i, "id": task_id, "status": "updated", "task": updated[task_id]}
+        for i, task_id in enumerate(task_ids)
+    ]}
+
+
+@app.delete("/tasks/batch", response_model=BatchDeleteResult)
+async def delete_tasks_batch(request: TaskBatchDelete):
+    task_ids = list(dict.fromkeys(request.task_ids))
+    if not task_ids or len(task_ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch must contain between 1 and {MAX_BATCH_SIZE} tasks")
+
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            sql = """
-                INSERT INTO Task (Description, Progress, Assignee, DateDue, ToDoListID, OwnerID)
-                VALUES (%s, %s, %s, %s, %s, %s);
-            """
-            values = (
-                task.description,
-                task.progress if task.progress else "Uncompleted",
-                task.assignee if task.assignee is not None else None,
-                task.due_date if task.due_date else None,
-                task.todolist_id,
-                task.owner_id
-            )
-
-            cursor.execute(sql, values)
-            connection.commit()
-
-            task_id = cursor.lastrowid
-            cursor.execute("""
-                SELECT TaskID, Description, Progress, Assignee, DateDue, DateCreated, ToDoListID, OwnerID
-                FROM Task WHERE TaskID = %s
-            """, (task_id,))
-            new_task = cursor.fetchone()
-
-        connection.close()
-        return {"message": "Task created successfully", "task": dict(zip(["id", "description", "progress", "assignee", "due_date", "created_at", "todolist_id", "owner_id"], new_task))}
+        async with db.acquire() as connection:
+            async with connection.cursor() as cursor:
+                task_lists = await _task_lists(cursor, task_ids)
+                missing = [{"index": i, "id": task_id, "error": "Task not found"}
+                           for i, task_id in enumerate(task_ids) if task_id not in task_lists]
+                if missing:
+                    _batch_error(404, missing)
+
+                placeholders = ", ".join(["%s"] * len(task_ids))
+                await cursor.execute(f"DELETE FROM Task WHERE TaskID IN ({placeholders});", tuple(task_ids))
+                changes = await _record_changes_by_list(cursor, task_lists, TASK_DELETE)
+                await connection.commit()
+                await _task_changes_committed(cursor, changes)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.put("/tasks/{task_id}")
-def update_task(task_id: int, task_update: TaskUpdate):
+    return {"message": f"{len(task_ids)} tasks deleted successfully", "results": [
+        {"index": i, "id": task_id, "status": "deleted"} for i, task_id in enumerate(task_ids)
+    ]}
+
+
+@app.put("/tasks/{task_id}", response_model=TaskSaved)
+async def update_task(task_id: int, task_update: TaskUpdate):
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT * FROM Task WHERE TaskID = %s;", (task_id,))
-            existing_task = cursor.fetchone()
-            if not existing_task:
-                raise HTTPException(status_code=404, detail="Task not found")
-
-            update_fields = []
-            update_values = []
-
-            if task_update.description is not None:
-                update_fields.append("Description = %s")
-                update_values.append(task_update.description)
-            if task_update.assignee is not None:
-                update_fields.append("Assignee = %s")
-                update_values.append(task_update.assignee)
-            if task_update.due_date is not None:
-                update_fields.append("DateDue = %s")
-                update_values.append(task_update.due_date)
-            if task_update.progress is not None:
-                if task_update.progress not in ["Uncompleted", "Completed"]:
-                    raise HTTPException(status_code=400, detail="Invalid progress value")
-                update_fields.append("Progress = %s")
-                update_values.append(task_update.progress)
-
-            if not update_fields:
-                raise HTTPException(status_code=400, detail="No fields to update")
-
-            update_values.append(task_id)
-            sql_query = f"UPDATE Task SET {', '.join(update_fields)} WHERE TaskID = %s;"
-            cursor.execute(sql_query, tuple(update_values))
-            connection.commit()
-
-            cursor.execute("SELECT TaskID, Description, COALESCE(Assignee, 0), COALESCE(DateDue, '0000-00-00'), COALESCE(Progress, 'Uncompleted') FROM Task WHERE TaskID = %s;", (task_id,))
-            updated_task = cursor.fetchone()
-
-        connection.close()
+        async with db.acquire() as connection:
+            async with connection.cursor() as cursor:
+                # Lock the row so a concurrent delete can't slip in between this
+                # check and the change we log for it.
+                await cursor.execute("SELECT ToDoListID FROM Task WHERE TaskID = %s FOR UPDATE;", (task_id,))
+                existing_task = await cursor.fetchone()
+                if not existing_task:
+                    raise HTTPException(status_code=404, detail="Task not found")
+
+                update_fields = []
+                update_values = []
+
+                if task_update.description is not None:
+                    update_fields.append("Description = %s")
+                    update_values.append(task_update.description)
+                if task_update.assignee is not None:
+                    update_fields.append("Assignee = %s")
+                    update_values.append(task_update.assignee)
+                if task_update.due_date is not None:
+                    update_fields.append("DateDue = %s")
+                    update_values.append(task_update.due_date)
+                if task_update.progress is not None:
+                    if task_update.progress not in ["Uncompleted", "Completed"]:
+                        raise HTTPException(status_code=400, detail="Invalid progress value")
+                    update_fields.append("Progress = %s")
+                    update_values.append(task_update.progress)
+
+                if not update_fields:
+                    raise HTTPException(status_code=400, detail="No fields to update")
+
+                update_values.append(task_id)
+                sql_query = f"UPDATE Task SET {', '.join(update_fields)} WHERE TaskID = %s;"
+                await cursor.execute(sql_query, tuple(update_values))
+                seq = await record_task_change(cursor, existing_task[0], task_id, TASK_UPSERT)
+                await connection.commit()
+                await _task_changes_committed(cursor, [(existing_task[0], task_id, seq, TASK_UPSERT)])
+
+                updated_task = await _fetch_saved_task(cursor, task_id)
+
         return {"message": "Task updated successfully", "task": updated_task}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 
 @app.delete("/tasks/{task_id}")
-def delete_task(task_id: int):
+async def delete_task(task_id: int):
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT * FROM Task WHERE TaskID = %s;", (task_id,))
-            existing_task = cursor.fetchone()
-            if not existing_task:
-                raise HTTPException(status_code=404, detail="Task not found")
-
-            cursor.execute("DELETE FROM Task WHERE TaskID = %s;", (task_id,))
-            connection.commit()
-        connection.close()
+        async with db.acquire() as connection:
+            async with connection.cursor() as cursor:
+                # Lock the row so a concurrent delete can't slip in between this
+                # check and the change we log for it.
+                await cursor.execute("SELECT ToDoListID FROM Task WHERE TaskID = %s FOR UPDATE;", (task_id,))
+                existing_task = await cursor.fetchone()
+                if not existing_task:
+                    raise HTTPException(status_code=404, detail="Task not found")
+
+                await cursor.execute("DELETE FROM Task WHERE TaskID = %s;", (task_id,))
+                seq = await record_task_change(cursor, existing_task[0], task_id, TASK_DELETE)
+                await connection.commit()
+                await _task_changes_committed(cursor, [(existing_task[0], task_id, seq, TASK_DELETE)])
         return {"message": "Task deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/todolists/{todolist_id}")
-def delete_todolist(todolist_id: int):
+async def delete_todolist(todolist_id: int):
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT * FROM ToDoList WHERE ToDoListID = %s;", (todolist_id,))
-            existing_todolist = cursor.fetchone()
-            if not existing_todolist:
-                raise HTTPException(status_code=404, detail="Todo list not found")
-
-            cursor.execute("DELETE FROM Task WHERE ToDoListID = %s;", (todolist_id,))
-            cursor.execute("DELETE FROM ToDoListShare WHERE ToDoListID = %s;", (todolist_id,))
-            cursor.execute("DELETE FROM ToDoList WHERE ToDoListID = %s;", (todolist_id,))
-            connection.commit()
-        connection.close()
+        async with db.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute("SELECT InviteCode FROM ToDoList WHERE ToDoListID = %s;", (todolist_id,))
+                existing_todolist = await cursor.fetchone()
+                if not existing_todolist:
+                    raise HTTPException(status_code=404, detail="Todo list not found")
+
+                # Everyone who can see the list needs their cached overview dropped.
+                user_ids = await _list_user_ids(cursor, todolist_id)
+
+                # Tasks, shares and the change log cascade from the list row, so
+                # syncing clients get a 404 afterwards and discard the list.
+                await cursor.execute("DELETE FROM ToDoList WHERE ToDoListID = %s;", (todolist_id,))
+                await connection.commit()
+        await forget_invite_code(existing_todolist[0])
+        await invalidate(f"tasks:{todolist_id}", f"members:{todolist_id}", *[f"todolists:{u}" for u in user_ids])
+        await broker.publish({"type": "list.deleted", "todolist_id": todolist_id})
         return {"message": "Todo list deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -376,32 +1140,28 @@ class LeaveListRequest(BaseModel):
 
 
 @app.post("/todolists/{todolist_id}/leave")
-def leave_todolist(todolist_id: int, request: LeaveListRequest):
+async def leave_todolist(todolist_id: int, request: LeaveListRequest):
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            # Check if the user is a member of this shared list
-            cursor.execute("""
-                SELECT * FROM ToDoListShare 
-                WHERE ToDoListID = %s AND UserID = %s
-            """, (todolist_id, request.user_id))
-            membership = cursor.fetchone()
-            
-            if not membership:
-                raise HTTPException(status_code=404, detail="User is not a member of this list or list does not exist")
-            
-            # Remove user from the shared list
-            cursor.execute("""
-                DELETE FROM ToDoListShare 
-                WHERE ToDoListID = %s AND UserID = %s
-            """, (todolist_id, request.user_id))
-            
-            connection.commit()
-            
-        connection.close()
+        async with db.acquire() as connection:
+            async with connection.cursor() as cursor:
+                # Check if the user is a member of this shared list
+                await cursor.execute(MEMBERSHIP_SELECT, (todolist_id, request.user_id))
+                membership = await cursor.fetchone()
+
+                if not membership:
+                    raise HTTPException(status_code=404, detail="User is not a member of this list or list does not exist")
+
+                # Remove user from the shared list
+                await cursor.execute("""
+                    DELETE FROM ToDoListShare 
+                    WHERE ToDoListID = %s AND UserID = %s
+                """, (todolist_id, request.user_id))
+
+                await connection.commit()
+
+        await invalidate(f"todolists:{request.user_id}", f"members:{todolist_id}")
         return {"message": "Successfully left the shared list"}
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=f"Error leaving list: {str(e)}")
-
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("EVENTS_SUBSCRIBER_QUEUE_SIZE", 256))
+
+
+class EventBus:
+    """Carries events between backend replicas.
+
+    Every replica's Broker publishes to the bus and listens on it, so an event
+    committed on one replica reaches WebSocket subscribers on all of them.
+    """
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, event):
+        raise NotImplementedError
+
+    def listen(self):
+        """Async iterator over every event published on the bus, including our own."""
+        raise NotImplementedError
+
+
+class InMemoryBus(EventBus):
+    """Single-process bus. Also stands in for a shared bus in tests: hand the
+    same instance to several Brokers to simulate multiple replicas."""
+
+    def __init__(self):
+        self._listeners = set()
+
+    async def publish(self, event):
+        for queue in list(self._listeners):
+            queue.put_nowait(event)
+
+    async def listen(self):
+        queue = asyncio.Queue()
+        self._listeners.add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._listeners.discard(queue)
+
+
+class RedisBus(EventBus):
+    """Pub/sub over any Redis-compatible server. Needs the optional `redis` package."""
+
+    channel = "todo-events"
+
+    def __init__(self, url):
+        self.url = url
+        self._redis = None
+
+    async def start(self):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(self.url)
+
+    async def stop(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def publish(self, event):
+        await self._redis.publish(self.channel, json.dumps(event))
+
+    async def listen(self):
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(self.channel)
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    yield json.loads(message["data"])
+        finally:
+            await pubsub.aclose()
+
+
+def bus_from_env():
+    url = os.getenv("EVENT_BUS_URL", "")
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBus(url)
+    return InMemoryBus()
+
+
+class Subscription:
+    def __init__(self, todolist_id):
+        self.todolist_id = todolist_id
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Set when the subscriber fell too far behind and was dropped; it has to
+        # reconnect and resume from the last sequence it saw.
+        self.lagged = False
+
+
+class Broker:
+    """Fans bus events out to the WebSocket subscribers of each todo list."""
+
+    def __init__(self, bus):
+        self.bus = bus
+        self._subscriptions = {}
+        self._pump = None
+
+    async def start(self):
+        await self.bus.start()
+        self._pump = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._pump is not None:
+            self._pump.cancel()
+            try:
+                await self._pump
+            except asyncio.CancelledError:
+                pass
+            self._pump = None
+        await self.bus.stop()
+
+    async def _run(self):
+        while True:
+            try:
+                async for event in self.bus.listen():
+                    self._dispatch(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Event bus listener failed, reconnecting")
+                await asyncio.sleep(1)
+
+    def _dispatch(self, event):
+        for sub in list(self._subscriptions.get(event["todolist_id"], ())):
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Never let one slow consumer hold up the others.
+                sub.lagged = True
+                self.unsubscribe(sub)
+
+    async def publish(self, event):
+        try:
+            await self.bus.publish(event)
+        except Exception:
+            # The write is already committed; subscribers catch up on resume.
+            logger.exception("Failed to publish event for todo list %s", event.get("todolist_id"))
+
+    def subscribe(self, todolist_id):
+        sub = Subscription(todolist_id)
+        self._subscriptions.setdefault(todolist_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        subs = self._subscriptions.get(sub.todolist_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._subscriptions[sub.todolist_id]
+        # Wake the reader so it notices the subscription ended.
+        if sub.lagged:
+            try:
+                sub.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                sub.queue.get_nowait()
+                sub.queue.put_nowait(None)
+
+    def subscriber_count(self):
+        return sum(len(subs) for subs in self._subscriptions.values())
+
+
+broker = Broker(bus_from_env())
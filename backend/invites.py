@@ -0,0 +1,87 @@
+import os
+import secrets
+import string
+from datetime import datetime, timedelta, timezone
+
+import pymysql
+
+from cache import LRUCache
+
+INVITE_CODE_ALPHABET = string.ascii_uppercase + string.digits
+# 36^8 codes puts the birthday bound near 1.7M lists, versus ~7.8K for the old 5 characters.
+INVITE_CODE_LENGTH = int(os.getenv("INVITE_CODE_LENGTH", 8))
+INVITE_CODE_MAX_ATTEMPTS = 5
+# Hot codes are resolved from memory. A cached code that was revoked on another
+# replica is still rejected by join_todolist's guarded INSERT, so the TTL only
+# bounds how long a dead entry takes up space.
+INVITE_CACHE_TTL = float(os.getenv("INVITE_CACHE_TTL", 300))
+INVITE_CACHE_SIZE = int(os.getenv("INVITE_CACHE_SIZE", 50000))
+
+MYSQL_DUPLICATE_ENTRY = 1062
+
+INVITE_CODE_SELECT = "SELECT ToDoListID, InviteExpiresAt FROM ToDoList WHERE InviteCode = %s;"
+
+invite_cache = LRUCache(INVITE_CACHE_SIZE, INVITE_CACHE_TTL)
+
+
+def utcnow():
+    # InviteExpiresAt is a naive DATETIME holding UTC.
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def generate_invite_code(length=None):
+    return "".join(secrets.choice(INVITE_CODE_ALPHABET) for _ in range(length or INVITE_CODE_LENGTH))
+
+
+def normalize_invite_code(code):
+    return code.strip().upper()
+
+
+def invite_expiry(ttl_hours):
+    return (utcnow() + timedelta(hours=ttl_hours)).replace(microsecond=0) if ttl_hours else None
+
+
+def is_invite_code_collision(error):
+    return (isinstance(error, pymysql.err.IntegrityError)
+            and error.args[0] == MYSQL_DUPLICATE_ENTRY
+            and "uq_todolist_invite_code" in str(error.args[1]))
+
+
+async def execute_with_invite_code(cursor, sql, make_params, generate=generate_invite_code):
+    """Executes `sql` with `make_params(code)` for a fresh code, retrying on a unique-index collision.
+
+    Returns the code that was stored.
+    """
+    for attempt in range(INVITE_CODE_MAX_ATTEMPTS):
+        code = generate()
+        try:
+            await cursor.execute(sql, make_params(code))
+            return code
+        except pymysql.err.IntegrityError as e:
+            if not is_invite_code_collision(e) or attempt == INVITE_CODE_MAX_ATTEMPTS - 1:
+                raise
+
+
+async def resolve_invite_code(cursor, code):
+    """Returns the list id for a live (not revoked, not expired) code, or None."""
+    group = f"invite:{code}"
+    cached = await invite_cache.get(group, "")
+    if cached is not None:
+        todolist_id, expires_at = cached
+        if expires_at is None or expires_at > utcnow():
+            return todolist_id
+        await forget_invite_code(code)
+        return None
+
+    generation = await invite_cache.generation(group)
+    await cursor.execute(INVITE_CODE_SELECT, (code,))
+    row = await cursor.fetchone()
+    if row is None or (row[1] is not None and row[1] <= utcnow()):
+        return None
+    await invite_cache.set(group, "", row, generation)
+    return row[0]
+
+
+async def forget_invite_code(code):
+    if code:
+        await invite_cache.invalidate(f"invite:{code}")
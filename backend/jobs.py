@@ -0,0 +1,234 @@
+"""Periodic background jobs over task due dates.
+
+Every replica runs the Scheduler, but a job only runs where it wins a MySQL
+named lock (GET_LOCK) and its JobRun row says the interval has passed, so
+across the cluster each job runs about once per interval. Jobs:
+
+  due_rollup  rebuilds TaskDueRollup, the per-user overdue/due-soon counts
+              served by GET /home/{user_id}
+  reminders   hands due-soon and newly overdue tasks to the reminder sink,
+              recording each in TaskReminder so it is sent once
+
+Both select tasks with a range on (Progress, DateDue); see
+migrations/0006_due_date_jobs.sql.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+
+from metrics import job_duration, job_runs, reminders_sent
+
+logger = logging.getLogger(__name__)
+
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "1") == "1"
+DUE_ROLLUP_INTERVAL = float(os.getenv("DUE_ROLLUP_INTERVAL", 300))
+REMINDER_INTERVAL = float(os.getenv("REMINDER_INTERVAL", 60))
+# "Due soon" is today through this many days ahead.
+DUE_SOON_DAYS = int(os.getenv("DUE_SOON_DAYS", 1))
+# Only tasks that went overdue this recently get an overdue reminder, so a
+# first run doesn't remind about every task that has ever slipped.
+OVERDUE_REMINDER_DAYS = int(os.getenv("OVERDUE_REMINDER_DAYS", 1))
+REMINDER_BATCH_SIZE = 500
+ROLLUP_INSERT_CHUNK = 1000
+
+REMINDER_DUE_SOON = "due_soon"
+REMINDER_OVERDUE = "overdue"
+
+DUE_ROLLUP_SELECT = """
+    SELECT COALESCE(Assignee, OwnerID) AS UserID,
+           SUM(DateDue < CURDATE()),
+           SUM(DateDue >= CURDATE())
+    FROM Task
+    WHERE Progress = 'Uncompleted' AND DateDue <= DATE_ADD(CURDATE(), INTERVAL %s DAY)
+    GROUP BY UserID;
+"""
+PENDING_REMINDERS_SELECT = """
+    SELECT Task.TaskID, Task.Description, Task.DateDue, Task.ToDoListID, COALESCE(Task.Assignee, Task.OwnerID)
+    FROM Task
+    LEFT JOIN TaskReminder ON TaskReminder.TaskID = Task.TaskID
+        AND TaskReminder.Kind = %s AND TaskReminder.DateDue = Task.DateDue
+    WHERE Task.Progress = 'Uncompleted'
+      AND Task.DateDue >= DATE_ADD(CURDATE(), INTERVAL %s DAY)
+      AND Task.DateDue <= DATE_ADD(CURDATE(), INTERVAL %s DAY)
+      AND TaskReminder.TaskID IS NULL
+    ORDER BY Task.DateDue, Task.TaskID
+    LIMIT %s;
+"""
+
+
+class ReminderSink:
+    """Where reminders go. send() raising leaves the batch unrecorded, so it is retried on the next run."""
+
+    async def send(self, reminders):
+        raise NotImplementedError
+
+
+class LogSink(ReminderSink):
+    async def send(self, reminders):
+        for r in reminders:
+            logger.info("Reminder %s: task %s (%r) due %s for user %s",
+                        r["kind"], r["task_id"], r["description"], r["due_date"], r["user_id"])
+
+
+class QueueSink(ReminderSink):
+    """Collects reminders on an asyncio.Queue, for a local consumer or tests."""
+
+    def __init__(self, maxsize=0):
+        self.queue = asyncio.Queue(maxsize)
+
+    async def send(self, reminders):
+        for r in reminders:
+            await self.queue.put(r)
+
+
+def sink_from_env():
+    kind = os.getenv("REMINDER_SINK", "log")
+    if kind == "queue":
+        return QueueSink()
+    if kind != "log":
+        logger.warning("Unknown REMINDER_SINK %r, logging reminders instead", kind)
+    return LogSink()
+
+
+async def rebuild_due_rollup(connection, cursor):
+    """Recomputes TaskDueRollup from uncompleted tasks due up to DUE_SOON_DAYS ahead."""
+    # A plain (non-locking) read; INSERT ... SELECT would share-lock the Task
+    # rows it scans and stall writers for the length of the job.
+    await cursor.execute(DUE_ROLLUP_SELECT, (DUE_SOON_DAYS,))
+    rows = [(user_id, int(overdue), int(due_soon)) for user_id, overdue, due_soon in await cursor.fetchall()]
+
+    # Readers see the old rollup until this commits.
+    await cursor.execute("DELETE FROM TaskDueRollup;")
+    for i in range(0, len(rows), ROLLUP_INSERT_CHUNK):
+        chunk = rows[i:i + ROLLUP_INSERT_CHUNK]
+        placeholders = ", ".join(["(%s, %s, %s, UTC_TIMESTAMP())"] * len(chunk))
+        await cursor.execute(f"INSERT INTO TaskDueRollup (UserID, Overdue, DueSoon, ComputedAt) VALUES {placeholders};",
+                             tuple(v for row in chunk for v in row))
+    await connection.commit()
+    return len(rows)
+
+
+async def _pending_reminders(cursor, kind, first_day, last_day):
+    """Uncompleted tasks due between CURDATE() + first_day and + last_day that haven't had this reminder."""
+    await cursor.execute(PENDING_REMINDERS_SELECT, (kind, first_day, last_day, REMINDER_BATCH_SIZE))
+    return [
+        {"kind": kind, "task_id": t[0], "description": t[1], "due_date": t[2], "todolist_id": t[3], "user_id": t[4]}
+        for t in await cursor.fetchall()
+    ]
+
+
+def send_reminders(sink):
+    async def run(connection, cursor):
+        sent = 0
+        for kind, first_day, last_day in [(REMINDER_DUE_SOON, 0, DUE_SOON_DAYS),
+                                          (REMINDER_OVERDUE, -OVERDUE_REMINDER_DAYS, -1)]:
+            while True:
+                reminders = await _pending_reminders(cursor, kind, first_day, last_day)
+                if not reminders:
+                    break
+                placeholders = ", ".join(["(%s, %s, %s, UTC_TIMESTAMP())"] * len(reminders))
+                await cursor.execute(
+                    f"INSERT IGNORE INTO TaskReminder (TaskID, DateDue, Kind, SentAt) VALUES {placeholders};",
+                    tuple(v for r in reminders for v in (r["task_id"], r["due_date"], kind)))
+                # Recorded and sent together: if the sink fails, the rollback
+                # leaves these to be sent again next run.
+                await sink.send(reminders)
+                await connection.commit()
+                reminders_sent.inc(kind, amount=len(reminders))
+                sent += len(reminders)
+                if len(reminders) < REMINDER_BATCH_SIZE:
+                    break
+        return sent
+    return run
+
+
+class Job:
+    def __init__(self, name, interval, run):
+        self.name = name
+        self.interval = interval
+        self.run = run  # async (connection, cursor) -> result, commits its own work
+
+
+class Scheduler:
+    def __init__(self, database, jobs):
+        self.database = database
+        self.jobs = jobs
+        self._tasks = []
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._loop(job)) for job in self.jobs]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def _loop(self, job):
+        while True:
+            # Jitter keeps replicas started together from polling in lockstep.
+            await asyncio.sleep(job.interval * random.uniform(0.1, 0.3))
+            try:
+                await self.run_once(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job %s failed", job.name)
+            await asyncio.sleep(job.interval * random.uniform(0.7, 0.9))
+
+    async def run_once(self, job, force=False):
+        """Runs `job` if this replica gets its lock and it is due (or `force`). Returns whether it ran."""
+        lock = f"tododb_job:{job.name}"
+        async with self.database.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute("SELECT GET_LOCK(%s, 0);", (lock,))
+                if (await cursor.fetchone())[0] != 1:
+                    job_runs.inc(job.name, "skipped")
+                    return False
+                try:
+                    if not force and not await self._due(connection, cursor, job):
+                        job_runs.inc(job.name, "skipped")
+                        return False
+                    start = time.perf_counter()
+                    try:
+                        result = await job.run(connection, cursor)
+                        await cursor.execute("""
+                            INSERT INTO JobRun (Name, LastRunAt) VALUES (%s, UTC_TIMESTAMP())
+                            ON DUPLICATE KEY UPDATE LastRunAt = VALUES(LastRunAt);
+                        """, (job.name,))
+                        await connection.commit()
+                    except Exception:
+                        job_runs.inc(job.name, "error")
+                        raise
+                    finally:
+                        elapsed = time.perf_counter() - start
+                        job_duration.observe(elapsed, job.name)
+                    job_runs.inc(job.name, "ok")
+                    logger.info("Job %s finished in %.2fs: %s", job.name, elapsed, result)
+                    return True
+                finally:
+                    await cursor.execute("SELECT RELEASE_LOCK(%s);", (lock,))
+                    await cursor.fetchone()
+
+    async def _due(self, connection, cursor, job):
+        await cursor.execute("SELECT TIMESTAMPDIFF(SECOND, LastRunAt, UTC_TIMESTAMP()) FROM JobRun WHERE Name = %s;",
+                             (job.name,))
+        row = await cursor.fetchone()
+        # End this snapshot so the job reads current data.
+        await connection.rollback()
+        # Replicas poll with jitter, so allow a run slightly early rather than skip a whole interval.
+        return row is None or row[0] >= job.interval * 0.9
+
+
+def scheduler_from_env(database, sink=None):
+    sink = sink or sink_from_env()
+    return Scheduler(database, [
+        Job("due_rollup", DUE_ROLLUP_INTERVAL, rebuild_due_rollup),
+        Job("reminders", REMINDER_INTERVAL, send_reminders(sink)),
+    ])
@@ -0,0 +1,364 @@
+"""Prometheus text-format metrics for the API and its database access.
+
+A small in-process registry rather than prometheus_client: a handful of
+series and nothing else to install.
+
+With several workers per pod (see serve.py), METRICS_MULTIPROCESS_DIR is set
+and every worker writes its samples there as <pid>.json, at least every
+METRICS_SYNC_INTERVAL seconds. /metrics merges all of them, so a scrape sees
+the whole pod whichever worker answers: counters and histograms are summed,
+including those of workers that have exited, so they never go backwards;
+gauges come from live workers only and are combined per their
+multiprocess_mode.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import math
+import os
+import re
+import time
+
+slow_query_logger = logging.getLogger("slow_query")
+
+# Opt-in: log queries slower than this many milliseconds.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_LOG_MS", "0")) or None
+
+METRICS_MULTIPROCESS_DIR = os.getenv("METRICS_MULTIPROCESS_DIR") or None
+METRICS_SYNC_INTERVAL = float(os.getenv("METRICS_SYNC_INTERVAL", 1))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+# Statements issued while serving the current request, set by MetricsMiddleware.
+_request_queries = contextvars.ContextVar("request_queries", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, *labelvalues, amount=1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        return list(self._values.items())
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, multiprocess_mode="sum", **kwargs):
+        super().__init__(*args, **kwargs)
+        # How live workers' values combine: "sum", "max" or "min".
+        self.multiprocess_mode = multiprocess_mode
+        self._values = {}
+
+    def set(self, value, *labelvalues):
+        self._values[labelvalues] = value
+
+    def inc(self, *labelvalues, amount=1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def samples(self):
+        return list(self._values.items())
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._series = {}
+
+    def observe(self, value, *labelvalues):
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [[0] * len(self.buckets), 0.0, 0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        return [(labelvalues, [list(counts), total, count]) for labelvalues, (counts, total, count) in self._series.items()]
+
+
+def _combine(family, current, value):
+    if family["kind"] == "histogram":
+        return [[a + b for a, b in zip(current[0], value[0])], current[1] + value[1], current[2] + value[2]]
+    mode = family.get("mode", "sum")
+    if mode == "max":
+        return max(current, value)
+    if mode == "min":
+        return min(current, value)
+    return current + value
+
+
+def _merge(snapshots):
+    """Combines [(worker alive?, snapshot)] into one list of families with {labelvalues: value} samples."""
+    merged = {}
+    for alive, snapshot in snapshots:
+        for family in snapshot:
+            if family["kind"] == "gauge" and not alive:
+                continue
+            target = merged.setdefault(family["name"], {**family, "samples": {}})
+            for labelvalues, value in family["samples"]:
+                key = tuple(labelvalues)
+                current = target["samples"].get(key)
+                target["samples"][key] = value if current is None else _combine(family, current, value)
+    return list(merged.values())
+
+
+def _render(families):
+    lines = []
+    for family in families:
+        name, labelnames = family["name"], family["labelnames"]
+        lines.extend([f"# HELP {name} {family['help']}", f"# TYPE {name} {family['kind']}"])
+        for labelvalues, value in family["samples"].items():
+            if family["kind"] != "histogram":
+                lines.append(f"{name}{_labels(labelnames, labelvalues)} {_number(value)}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, n in zip(family["buckets"], counts):
+                cumulative += n
+                le = (("le", _number(bound)),)
+                lines.append(f"{name}_bucket{_labels(labelnames, labelvalues, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labelnames, labelvalues)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(labelnames, labelvalues)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """Registers fn() -> [(name, kind, help, value)], evaluated at scrape time."""
+        self._collectors.append(fn)
+        return fn
+
+    def snapshot(self):
+        """This process's samples as JSON-ready metric families."""
+        families = []
+        for metric in self._metrics:
+            family = {"name": metric.name, "kind": metric.kind, "help": metric.documentation,
+                      "labelnames": metric.labelnames, "samples": metric.samples()}
+            if isinstance(metric, Gauge):
+                family["mode"] = metric.multiprocess_mode
+            if isinstance(metric, Histogram):
+                family["buckets"] = metric.buckets
+            families.append(family)
+        for fn in self._collectors:
+            for name, kind, documentation, value in fn():
+                families.append({"name": name, "kind": kind, "help": documentation, "labelnames": (),
+                                 "samples": [((), value)]})
+        return families
+
+    def write_snapshot(self, directory=None):
+        directory = directory or METRICS_MULTIPROCESS_DIR
+        if directory is None:
+            return
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+    async def sync_snapshots(self):
+        """Writes this worker's snapshot every METRICS_SYNC_INTERVAL until cancelled, then once more."""
+        try:
+            while True:
+                self.write_snapshot()
+                await asyncio.sleep(METRICS_SYNC_INTERVAL)
+        finally:
+            self.write_snapshot()
+
+    def render(self):
+        if METRICS_MULTIPROCESS_DIR is None:
+            return _render(_merge([(True, self.snapshot())]))
+        self.write_snapshot()
+        snapshots = []
+        for filename in os.listdir(METRICS_MULTIPROCESS_DIR):
+            pid, ext = os.path.splitext(filename)
+            if ext != ".json" or not pid.isdigit():
+                continue
+            try:
+                with open(os.path.join(METRICS_MULTIPROCESS_DIR, filename)) as f:
+                    snapshots.append((_alive(int(pid)), json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return _render(_merge(snapshots))
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")))
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status")))
+http_errors = registry.register(Counter(
+    "http_request_errors_total", "HTTP requests that ended in a 5xx or an unhandled exception.", ("method", "route")))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served."))
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "Database statement latency by statement kind and table.", ("query",)))
+db_query_rows = registry.register(Histogram(
+    "db_query_rows", "Rows returned or affected per statement.", ("query",), buckets=ROW_BUCKETS))
+db_query_errors = registry.register(Counter(
+    "db_query_errors_total", "Database statements that raised.", ("query",)))
+db_acquire_duration = registry.register(Histogram(
+    "db_pool_acquire_seconds", "Time spent waiting for a pooled connection."))
+http_request_db_queries = registry.register(Histogram(
+    "http_request_db_queries", "Database statements issued per HTTP request.", ("method", "route"),
+    buckets=QUERY_COUNT_BUCKETS))
+job_duration = registry.register(Histogram(
+    "job_duration_seconds", "Background job run time.", ("job",),
+    buckets=LATENCY_BUCKETS + (30.0, 60.0, 300.0)))
+job_runs = registry.register(Counter(
+    "job_runs_total", "Background job runs by outcome: ok, error, or skipped (another replica has it).",
+    ("job", "outcome")))
+reminders_sent = registry.register(Counter(
+    "reminders_sent_total", "Due-date reminders handed to the reminder sink.", ("kind",)))
+db_reads = registry.register(Counter(
+    "db_reads_total", "Read connections handed out, by where they went (replica or primary).", ("target",)))
+db_replica_healthy = registry.register(Gauge(
+    "db_replica_healthy", "1 if the read replica is reachable and within the allowed lag.", ("replica",),
+    multiprocess_mode="min"))
+db_replica_lag = registry.register(Gauge(
+    "db_replica_lag_seconds", "Replication lag reported by the read replica.", ("replica",),
+    multiprocess_mode="max"))
+startup_duration = registry.register(Gauge(
+    "app_startup_seconds", "Seconds spent in each startup phase; \"total\" is from process start to ready.",
+    ("phase",), multiprocess_mode="max"))
+
+http_in_flight.set(0)
+
+_QUERY_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+`?(\w+)", re.IGNORECASE)
+
+
+def process_uptime():
+    """Seconds since this process was started, or None where /proc isn't available."""
+    try:
+        with open("/proc/self/stat") as f:
+            # starttime is field 22, in clock ticks since boot; fields after the
+            # parenthesised command name start at field 3.
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def query_label(sql):
+    """Low-cardinality label for a statement, e.g. "SELECT Task"."""
+    words = sql.split(None, 1)
+    verb = words[0].upper() if words else "?"
+    match = _QUERY_TABLE.search(sql)
+    return f"{verb} {match.group(1)}" if match else verb
+
+
+def observe_query(sql, params, seconds, rows, failed=False):
+    label = query_label(sql)
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+    db_query_duration.observe(seconds, label)
+    if failed:
+        db_query_errors.inc(label)
+    elif rows is not None and rows >= 0:
+        db_query_rows.observe(rows, label)
+    if SLOW_QUERY_MS is not None and seconds * 1000 >= SLOW_QUERY_MS:
+        slow_query_logger.warning("%.1f ms, %s rows: %s %r", seconds * 1000, rows, " ".join(sql.split()), params)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency, status and in-flight requests per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        queries = [0]
+        token = _request_queries.set(queries)
+        http_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_flight.dec()
+            _request_queries.reset(token)
+            # The router stores the matched route in the shared scope; fall back
+            # to a fixed label so unmatched paths can't blow up cardinality.
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            http_request_duration.observe(elapsed, method, route_path)
+            http_requests.inc(method, route_path, str(status["code"]))
+            http_request_db_queries.observe(queries[0], method, route_path)
+            if status["code"] >= 500:
+                http_errors.inc(method, route_path)
@@ -0,0 +1,125 @@
+"""Versioned schema migrations.
+
+Migrations are the numbered .sql files in migrations/ and are applied in
+order, each at most once; applied versions are recorded in SchemaMigration.
+They run at app startup (unless DB_MIGRATE_ON_STARTUP=0) or from the CLI:
+
+    python migrate.py            # apply pending migrations
+    python migrate.py --status   # list applied and pending migrations
+
+MySQL commits DDL implicitly, so a migration that fails halfway is not
+rolled back. Re-running it starts from the top and skips statements whose
+table, column, index or constraint already exists, so write data fixes in
+migrations to be safe to repeat.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import re
+
+import pymysql
+
+from db import Database, PoolConfig
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+# Held while migrating so replicas starting together don't race each other.
+LOCK_NAME = "tododb_schema_migrations"
+LOCK_TIMEOUT = 120
+# Table exists, duplicate column, duplicate key name, duplicate foreign key
+# name: the statement already ran in an earlier, failed attempt.
+ALREADY_APPLIED_ERRORS = {1050, 1060, 1061, 1826}
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Returns [(version, name, [statements])] sorted by version."""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = re.fullmatch(r"(\d+)_(\w+)\.sql", filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename)) as f:
+            migrations.append((int(match.group(1)), match.group(2), split_statements(f.read())))
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Duplicate migration version in " + directory)
+    return migrations
+
+
+def split_statements(sql):
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [stmt.strip() for stmt in "\n".join(lines).split(";") if stmt.strip()]
+
+
+async def applied_versions(cursor):
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS SchemaMigration (
+            Version INT NOT NULL PRIMARY KEY,
+            Name VARCHAR(255) NOT NULL,
+            AppliedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    await cursor.execute("SELECT Version FROM SchemaMigration;")
+    return {row[0] for row in await cursor.fetchall()}
+
+
+async def migrate(database):
+    """Applies pending migrations and returns the versions that were applied."""
+    applied_now = []
+    async with database.acquire() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute("SELECT GET_LOCK(%s, %s);", (LOCK_NAME, LOCK_TIMEOUT))
+            if (await cursor.fetchone())[0] != 1:
+                raise RuntimeError("Timed out waiting for the schema migration lock")
+            try:
+                done = await applied_versions(cursor)
+                for version, name, statements in load_migrations():
+                    if version in done:
+                        continue
+                    logger.info("Applying migration %04d_%s", version, name)
+                    for statement in statements:
+                        try:
+                            await cursor.execute(statement)
+                        except pymysql.err.MySQLError as e:
+                            if e.args[0] not in ALREADY_APPLIED_ERRORS:
+                                raise
+                            logger.info("Skipping already applied statement in %04d_%s: %s", version, name, e.args[1])
+                    await cursor.execute("INSERT INTO SchemaMigration (Version, Name) VALUES (%s, %s);", (version, name))
+                    await connection.commit()
+                    applied_now.append(version)
+            finally:
+                await cursor.execute("SELECT RELEASE_LOCK(%s);", (LOCK_NAME,))
+                await cursor.fetchone()
+    return applied_now
+
+
+async def status(database):
+    async with database.acquire() as connection:
+        async with connection.cursor() as cursor:
+            done = await applied_versions(cursor)
+    return [(version, name, version in done) for version, name, _ in load_migrations()]
+
+
+async def _main(args):
+    config = PoolConfig()
+    config.minsize = 1
+    database = Database(config)
+    await database.connect()
+    try:
+        if args.status:
+            for version, name, applied in await status(database):
+                print(f"{version:04d}_{name}: {'applied' if applied else 'pending'}")
+        else:
+            applied = await migrate(database)
+            print(f"Applied {len(applied)} migration(s)" + (f": {applied}" if applied else ""))
+    finally:
+        await database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply database schema migrations.")
+    parser.add_argument("--status", action="store_true", help="show applied and pending migrations")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,33 @@
+-- Tables as the app has always used them. IF NOT EXISTS lets databases created
+-- before migrations existed adopt this history without changes.
+CREATE TABLE IF NOT EXISTS User (
+    UserID INT NOT NULL AUTO_INCREMENT,
+    Username VARCHAR(255) NOT NULL,
+    PRIMARY KEY (UserID)
+);
+
+CREATE TABLE IF NOT EXISTS ToDoList (
+    ToDoListID INT NOT NULL AUTO_INCREMENT,
+    SharedFlag TINYINT(1) NOT NULL DEFAULT 0,
+    UserID INT NOT NULL,
+    Name VARCHAR(255) NOT NULL,
+    InviteCode VARCHAR(16) NULL,
+    PRIMARY KEY (ToDoListID)
+);
+
+CREATE TABLE IF NOT EXISTS ToDoListShare (
+    ToDoListID INT NOT NULL,
+    UserID INT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Task (
+    TaskID INT NOT NULL AUTO_INCREMENT,
+    Description TEXT NOT NULL,
+    Progress ENUM('Uncompleted', 'Completed') NOT NULL DEFAULT 'Uncompleted',
+    Assignee INT NULL,
+    DateDue DATE NULL,
+    DateCreated TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    ToDoListID INT NOT NULL,
+    OwnerID INT NOT NULL,
+    PRIMARY KEY (TaskID)
+);
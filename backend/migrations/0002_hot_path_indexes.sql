@@ -0,0 +1,74 @@
+-- Clean up what existing data would otherwise violate below. Every statement
+-- is a no-op on clean data, so the file can be re-run after a failure.
+
+-- Lists whose owner is gone, and what hangs off missing lists or users, go
+-- the way the cascades below would have sent them.
+DELETE ToDoList FROM ToDoList LEFT JOIN User ON User.UserID = ToDoList.UserID WHERE User.UserID IS NULL;
+DELETE ToDoListShare FROM ToDoListShare
+    LEFT JOIN ToDoList ON ToDoList.ToDoListID = ToDoListShare.ToDoListID
+    LEFT JOIN User ON User.UserID = ToDoListShare.UserID
+    WHERE ToDoList.ToDoListID IS NULL OR User.UserID IS NULL;
+DELETE Task FROM Task
+    LEFT JOIN ToDoList ON ToDoList.ToDoListID = Task.ToDoListID
+    LEFT JOIN User ON User.UserID = Task.OwnerID
+    WHERE ToDoList.ToDoListID IS NULL OR User.UserID IS NULL;
+UPDATE Task LEFT JOIN User ON User.UserID = Task.Assignee
+    SET Task.Assignee = NULL
+    WHERE Task.Assignee IS NOT NULL AND User.UserID IS NULL;
+
+-- Usernames registered twice by the old check-then-insert race: the first
+-- account keeps the name (it is the one /login returned), later ones get
+-- their id appended.
+UPDATE User JOIN (
+    SELECT Username, MIN(UserID) AS KeepID FROM User GROUP BY Username HAVING COUNT(*) > 1
+) AS Duplicate ON Duplicate.Username = User.Username
+    SET User.Username = CONCAT(LEFT(User.Username, 240), '#', User.UserID)
+    WHERE User.UserID <> Duplicate.KeepID;
+
+-- Colliding 5-character invite codes: the oldest list keeps its code, the
+-- others lose theirs and can generate a new one.
+UPDATE ToDoList JOIN (
+    SELECT InviteCode, MIN(ToDoListID) AS KeepID FROM ToDoList
+    WHERE InviteCode IS NOT NULL GROUP BY InviteCode HAVING COUNT(*) > 1
+) AS Duplicate ON Duplicate.InviteCode = ToDoList.InviteCode
+    SET ToDoList.InviteCode = NULL
+    WHERE ToDoList.ToDoListID <> Duplicate.KeepID;
+
+-- Shares joined twice by the old check-then-insert race in join_todolist.
+-- The table has no key to tell copies apart, so drop every copy and put one back.
+DROP TEMPORARY TABLE IF EXISTS DuplicateShare;
+CREATE TEMPORARY TABLE DuplicateShare AS
+    SELECT ToDoListID, UserID FROM ToDoListShare GROUP BY ToDoListID, UserID HAVING COUNT(*) > 1;
+DELETE ToDoListShare FROM ToDoListShare JOIN DuplicateShare USING (ToDoListID, UserID);
+INSERT INTO ToDoListShare (ToDoListID, UserID) SELECT ToDoListID, UserID FROM DuplicateShare;
+DROP TEMPORARY TABLE DuplicateShare;
+
+-- Unique lookups used by /register, /login and /todolists/join.
+CREATE UNIQUE INDEX uq_user_username ON User (Username);
+CREATE UNIQUE INDEX uq_todolist_invite_code ON ToDoList (InviteCode);
+
+-- Membership: (ToDoListID, UserID) serves per-list member lookups and stops
+-- duplicate joins; UserID alone serves "lists shared with me".
+CREATE UNIQUE INDEX uq_share_list_user ON ToDoListShare (ToDoListID, UserID);
+CREATE INDEX idx_share_user ON ToDoListShare (UserID);
+
+CREATE INDEX idx_todolist_owner ON ToDoList (UserID);
+
+-- GET /tasks/{todolist_id}: (ToDoListID, DateDue, TaskID) serves due-date
+-- ordering and calendar month ranges; (ToDoListID, Progress) the progress filter.
+CREATE INDEX idx_task_list_due_id ON Task (ToDoListID, DateDue, TaskID);
+CREATE INDEX idx_task_list_progress ON Task (ToDoListID, Progress);
+CREATE INDEX idx_task_assignee ON Task (Assignee);
+CREATE INDEX idx_task_owner ON Task (OwnerID);
+
+-- Removing a list or user removes what hangs off it, so delete_todolist
+-- needs a single DELETE.
+ALTER TABLE ToDoList
+    ADD CONSTRAINT fk_todolist_owner FOREIGN KEY (UserID) REFERENCES User (UserID) ON DELETE CASCADE;
+ALTER TABLE ToDoListShare
+    ADD CONSTRAINT fk_share_todolist FOREIGN KEY (ToDoListID) REFERENCES ToDoList (ToDoListID) ON DELETE CASCADE,
+    ADD CONSTRAINT fk_share_user FOREIGN KEY (UserID) REFERENCES User (UserID) ON DELETE CASCADE;
+ALTER TABLE Task
+    ADD CONSTRAINT fk_task_todolist FOREIGN KEY (ToDoListID) REFERENCES ToDoList (ToDoListID) ON DELETE CASCADE,
+    ADD CONSTRAINT fk_task_owner FOREIGN KEY (OwnerID) REFERENCES User (UserID) ON DELETE CASCADE,
+    ADD CONSTRAINT fk_task_assignee FOREIGN KEY (Assignee) REFERENCES User (UserID) ON DELETE SET NULL;
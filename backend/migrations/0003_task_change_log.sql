@@ -0,0 +1,14 @@
+-- Per-list change log backing GET /tasks/{todolist_id}/changes.
+-- ToDoList.ChangeSeq is the latest sequence issued for the list; TaskChange keeps
+-- one row per create/update/delete, with deletes acting as tombstones.
+ALTER TABLE ToDoList ADD COLUMN ChangeSeq BIGINT NOT NULL DEFAULT 0;
+
+CREATE TABLE TaskChange (
+    ToDoListID INT NOT NULL,
+    ChangeSeq BIGINT NOT NULL,
+    TaskID INT NOT NULL,
+    ChangeType VARCHAR(10) NOT NULL,
+    ChangedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (ToDoListID, ChangeSeq),
+    CONSTRAINT fk_taskchange_todolist FOREIGN KEY (ToDoListID) REFERENCES ToDoList (ToDoListID) ON DELETE CASCADE
+);
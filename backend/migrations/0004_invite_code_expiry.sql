@@ -0,0 +1,4 @@
+-- Invite codes grow from 5 to a configurable length (8 by default) and can expire.
+ALTER TABLE ToDoList
+    MODIFY InviteCode VARCHAR(16) NULL,
+    ADD COLUMN InviteExpiresAt DATETIME NULL;
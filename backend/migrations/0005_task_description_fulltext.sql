@@ -0,0 +1,4 @@
+-- Full-text index backing GET /search/{user_id}. Uses the default parser, which
+-- tokenizes on whitespace and punctuation; CJK descriptions would need
+-- WITH PARSER ngram instead.
+ALTER TABLE Task ADD FULLTEXT INDEX ft_task_description (Description);
@@ -0,0 +1,33 @@
+-- Background jobs over Task.DateDue (see jobs.py). (Progress, DateDue) turns
+-- "uncompleted and due before X" into a range scan; Assignee and OwnerID make
+-- it covering for the per-user rollup.
+CREATE INDEX idx_task_progress_due ON Task (Progress, DateDue, Assignee, OwnerID);
+
+-- Overdue and due-soon counts per user, rebuilt by the due_rollup job so reads
+-- don't scan tasks. A task counts for its assignee, or its owner if unassigned.
+CREATE TABLE TaskDueRollup (
+    UserID INT NOT NULL,
+    Overdue INT NOT NULL,
+    DueSoon INT NOT NULL,
+    ComputedAt DATETIME NOT NULL,
+    PRIMARY KEY (UserID),
+    CONSTRAINT fk_rollup_user FOREIGN KEY (UserID) REFERENCES User (UserID) ON DELETE CASCADE
+);
+
+-- One row per reminder sent, so each (task, due date, kind) is reminded once
+-- even across replicas and restarts. Moving the due date re-arms it.
+CREATE TABLE TaskReminder (
+    TaskID INT NOT NULL,
+    DateDue DATE NOT NULL,
+    Kind VARCHAR(10) NOT NULL,
+    SentAt DATETIME NOT NULL,
+    PRIMARY KEY (TaskID, Kind, DateDue),
+    CONSTRAINT fk_reminder_task FOREIGN KEY (TaskID) REFERENCES Task (TaskID) ON DELETE CASCADE
+);
+
+-- Last successful run of each job, shared by all replicas.
+CREATE TABLE JobRun (
+    Name VARCHAR(64) NOT NULL,
+    LastRunAt DATETIME NOT NULL,
+    PRIMARY KEY (Name)
+);
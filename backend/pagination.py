@@ -0,0 +1,39 @@
+import base64
+import json
+from datetime import date
+
+
+def encode_cursor(sort, row_key, task_id):
+    if isinstance(row_key, date):
+        row_key = row_key.isoformat()
+    payload = json.dumps({"s": sort, "k": row_key, "id": task_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort):
+    """Returns (sort key, task id) or raises ValueError for a malformed or mismatched cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        key, task_id = payload["k"], int(payload["id"])
+        same_sort = payload.get("s") == sort
+        if same_sort and sort == "due_date" and key is not None:
+            key = date.fromisoformat(key)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not same_sort:
+        raise ValueError("Cursor was issued for a different sort order")
+    return key, task_id
+
+
+def keyset_clause(sort, cursor_key, cursor_id):
+    """WHERE fragment selecting rows strictly after the cursor in (sort key, TaskID) order.
+
+    MySQL sorts NULL DateDue first in ascending order, which keeps the
+    (ToDoListID, DateDue, TaskID) index usable for the ORDER BY.
+    """
+    if sort == "task_id":
+        return "Task.TaskID > %s", [cursor_id]
+    if cursor_key is None:
+        return "((Task.DateDue IS NULL AND Task.TaskID > %s) OR Task.DateDue IS NOT NULL)", [cursor_id]
+    return "(Task.DateDue > %s OR (Task.DateDue = %s AND Task.TaskID > %s))", [cursor_key, cursor_key, cursor_id]
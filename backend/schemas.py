@@ -0,0 +1,138 @@
+"""Response models for the task, list and membership endpoints.
+
+They document the payloads in the OpenAPI schema and, for handlers that
+return plain dicts, let FastAPI serialize through pydantic-core instead of
+jsonable_encoder. Field names match what the app has always returned.
+"""
+from datetime import date, datetime
+from typing import Literal
+
+from pydantic import BaseModel
+
+
+class Task(BaseModel):
+    id: int
+    description: str
+    progress: str
+    assignee: str | None = None  # username
+    due_date: date | None = None
+    created_at: datetime | None = None
+    todolist_id: int
+    owner_id: int
+
+
+class SavedTask(Task):
+    """A task as written by POST /tasks or PUT /tasks/{task_id}: assignee is the user id."""
+
+    assignee: int | None = None
+
+
+class TaskPage(BaseModel):
+    tasks: list[Task]
+    next_cursor: str | None = None
+    sync_token: int | None = None
+
+
+class TaskChanges(BaseModel):
+    changed: list[Task]
+    deleted: list[int]
+    sync_token: int
+    has_more: bool
+
+
+class TaskSaved(BaseModel):
+    message: str
+    task: SavedTask
+
+
+class BatchCreated(BaseModel):
+    index: int
+    status: Literal["created"]
+    task: SavedTask
+
+
+class BatchUpdated(BaseModel):
+    index: int
+    id: int
+    status: Literal["updated"]
+    task: SavedTask
+
+
+class BatchDeleted(BaseModel):
+    index: int
+    id: int
+    status: Literal["deleted"]
+
+
+class BatchCreateResult(BaseModel):
+    message: str
+    results: list[BatchCreated]
+
+
+class BatchUpdateResult(BaseModel):
+    message: str
+    results: list[BatchUpdated]
+
+
+class BatchDeleteResult(BaseModel):
+    message: str
+    results: list[BatchDeleted]
+
+
+class SearchHit(Task):
+    score: float
+
+
+class SearchResults(BaseModel):
+    tasks: list[SearchHit]
+    next_cursor: str | None = None
+
+
+class ToDoList(BaseModel):
+    id: int
+    name: str
+    shared: bool
+    owner_id: int
+    inviteCode: str | None = None
+
+
+class ToDoLists(BaseModel):
+    todolists: list[ToDoList]
+
+
+class Member(BaseModel):
+    id: int
+    username: str
+    role: Literal["owner", "member"]
+
+
+class Members(BaseModel):
+    users: list[Member]
+
+
+class TaskCounts(BaseModel):
+    completed: int
+    uncompleted: int
+    overdue: int
+    total: int
+
+
+class HomeList(ToDoList):
+    members: list[Member]
+    counts: TaskCounts
+
+
+class HomeTasks(TaskPage):
+    todolist_id: int
+
+
+class DueSummary(BaseModel):
+    overdue: int
+    due_soon: int
+    computed_at: datetime
+
+
+class Home(BaseModel):
+    todolists: list[HomeList]
+    tasks: HomeTasks | None = None
+    due: DueSummary | None = None
@@ -0,0 +1,87 @@
+"""Ranked task search over the ft_task_description FULLTEXT index.
+
+The user's text is turned into a boolean-mode query where every word is
+required and matches as a prefix, so "groc list" finds "Grocery list".
+Results are ordered by relevance, newest first on ties, and paged with the
+same opaque cursors as GET /tasks/{todolist_id}.
+"""
+import os
+import re
+
+from pagination import decode_cursor, encode_cursor
+
+# Words shorter than innodb_ft_min_token_size are not in the index, so
+# requiring them would match nothing.
+SEARCH_MIN_WORD_LENGTH = int(os.getenv("SEARCH_MIN_WORD_LENGTH", 3))
+SEARCH_MAX_WORDS = 8
+MAX_SEARCH_PAGE_SIZE = 100
+
+_WORD = re.compile(r"\w+")
+_MATCH = "MATCH(Task.Description) AGAINST (%s IN BOOLEAN MODE)"
+
+# Columns 0-7 line up with TASK_SELECT so rows go through task_to_dict; 8 is the score.
+SEARCH_SELECT = f"""
+    SELECT Task.TaskID, Task.Description, Task.Progress, User.Username AS AssigneeName, Task.DateDue, Task.DateCreated, Task.ToDoListID, Task.OwnerID,
+           {_MATCH} AS Score
+    FROM Task
+    LEFT JOIN User ON Task.Assignee = User.UserID
+"""
+
+# Lists the user owns or has joined.
+_ACCESSIBLE_LISTS = """
+    Task.ToDoListID IN (
+        SELECT ToDoListID FROM ToDoList WHERE UserID = %s
+        UNION
+        SELECT ToDoListID FROM ToDoListShare WHERE UserID = %s
+    )
+"""
+
+
+def boolean_query(text):
+    """Returns the boolean-mode query for free text, or None if no word is long enough to search.
+
+    Only word characters survive, so user input can't inject full-text operators.
+    """
+    words = [w for w in _WORD.findall(text.lower()) if len(w) >= SEARCH_MIN_WORD_LENGTH]
+    if not words:
+        return None
+    return " ".join(f"+{w}*" for w in dict.fromkeys(words[:SEARCH_MAX_WORDS]))
+
+
+def search_query(user_id, query, limit, page_cursor=None, todolist_id=None):
+    """Returns (sql, params) for one page of search_tasks, fetching one extra row. Raises ValueError for a malformed cursor."""
+    conditions = [_MATCH, _ACCESSIBLE_LISTS]
+    params = [query, query, user_id, user_id]
+    if todolist_id is not None:
+        conditions.append("Task.ToDoListID = %s")
+        params.append(todolist_id)
+    if page_cursor is not None:
+        score, task_id = decode_cursor(page_cursor, "relevance")
+        try:
+            score = float(score)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        conditions.append(f"({_MATCH} < %s OR ({_MATCH} = %s AND Task.TaskID < %s))")
+        params.extend([query, score, query, score, task_id])
+
+    sql = SEARCH_SELECT + f"""
+        WHERE {' AND '.join(conditions)}
+        ORDER BY Score DESC, Task.TaskID DESC
+        LIMIT %s
+    """
+    return sql, (*params, limit + 1)
+
+
+async def search_tasks(cursor, user_id, query, limit, page_cursor=None, todolist_id=None):
+    """Returns (rows, next_cursor) for tasks matching `query` in lists `user_id` can access.
+
+    Raises ValueError for a malformed cursor.
+    """
+    await cursor.execute(*search_query(user_id, query, limit, page_cursor, todolist_id))
+    rows = await cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor("relevance", rows[-1][8], rows[-1][0])
+    return rows, next_cursor
@@ -0,0 +1,131 @@
+"""Production launcher: migrates once, then runs the app under several uvicorn workers.
+
+    python serve.py
+
+Settings come from the environment:
+
+  HOST, PORT                  bind address (0.0.0.0:5000)
+  WEB_CONCURRENCY             worker processes; defaults to the CPUs this
+                              container may use (cgroup quota, then affinity)
+  DB_CONNECTION_BUDGET        connections this pod may hold to each MySQL
+                              server (100); workers are capped so that
+                              workers x DB_POOL_MAX_SIZE stays within it
+  GRACEFUL_SHUTDOWN_TIMEOUT   seconds to let in-flight requests finish after
+                              SIGTERM before they are cancelled (20)
+  KEEP_ALIVE_TIMEOUT          idle keep-alive connection timeout (5)
+  ACCESS_LOG                  0 disables uvicorn's per-request log line (1)
+
+uvloop and httptools are used when installed, else asyncio and h11. Every
+worker has its own connection pool, in-process cache, event broker and
+metrics: set CACHE_URL and EVENT_BUS_URL to share the first two. Without
+CACHE_URL the response cache is turned off (CACHE_ENABLED=0) when there is
+more than one worker, since a write would only invalidate the copy in the
+worker that served it. Metrics are merged across workers through a shared directory
+(METRICS_MULTIPROCESS_DIR, see metrics.py); /stats/db-pool and /stats/cache
+still describe only the worker that answers.
+"""
+import asyncio
+import importlib.util
+import logging
+import math
+import os
+import tempfile
+
+import uvicorn
+
+from db import Database
+from migrate import migrate
+
+logger = logging.getLogger("serve")
+
+
+def cpu_count():
+    """CPUs available to this process, honouring a container CPU quota."""
+    available = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    quota = None
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:  # cgroup v2: "<quota> <period>" or "max <period>"
+            limit, period = f.read().split()
+            if limit != "max":
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:  # cgroup v1
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        available = min(available, math.ceil(quota))
+    return max(1, available)
+
+
+def _installed(module):
+    return importlib.util.find_spec(module) is not None
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+    workers = int(os.getenv("WEB_CONCURRENCY", 0)) or cpu_count()
+
+    if os.getenv("DB_MIGRATE_ON_STARTUP", "1") == "1":
+        # Once here instead of racing for the migration lock in every worker.
+        async def run_migrations():
+            database = Database()
+            database.config.minsize = 1
+            await database.connect()
+            try:
+                applied = await migrate(database)
+            finally:
+                await database.close()
+            if applied:
+                logger.info("Applied migrations %s", applied)
+
+        asyncio.run(run_migrations())
+        os.environ["DB_MIGRATE_ON_STARTUP"] = "0"
+
+    pool_max = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+    budget = int(os.getenv("DB_CONNECTION_BUDGET", 100))
+    max_workers = max(1, budget // pool_max)
+    if workers > max_workers:
+        # Every worker has its own pool; past the budget MySQL runs out of
+        # connection slots (max_connections is 151 by default).
+        logger.warning("Capping %d workers to %d: %d connections each would exceed DB_CONNECTION_BUDGET=%d",
+                       workers, max_workers, pool_max, budget)
+        workers = max_workers
+
+    if workers > 1:
+        if not os.getenv("METRICS_MULTIPROCESS_DIR"):
+            # Whichever worker a scrape reaches reports the whole pod.
+            os.environ["METRICS_MULTIPROCESS_DIR"] = tempfile.mkdtemp(prefix="metrics-")
+        if not os.getenv("CACHE_URL"):
+            os.environ.setdefault("CACHE_ENABLED", "0")
+        if not os.getenv("EVENT_BUS_URL"):
+            logger.warning("%d workers without EVENT_BUS_URL: WebSocket subscribers only see "
+                           "changes made through their own worker", workers)
+
+    loop = "uvloop" if _installed("uvloop") else "asyncio"
+    http = "httptools" if _installed("httptools") else "h11"
+    logger.info("Starting %d worker(s), loop=%s, http=%s, up to %d database connections",
+                workers, loop, http, workers * pool_max)
+
+    uvicorn.run(
+        "dbconnecttest:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", 5000)),
+        workers=workers,
+        loop=loop,
+        http=http,
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", 20)),
+        timeout_keep_alive=int(os.getenv("KEEP_ALIVE_TIMEOUT", 5)),
+        access_log=os.getenv("ACCESS_LOG", "1") == "1",
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+    )
+
+
+if __name__ == "__main__":
+    main()
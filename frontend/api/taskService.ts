@@ -43,6 +43,27 @@ export const fetchTasks = async (todolistId: number): Promise<Task[]> => {
   }
 };
 
+// 在用户可访问的所有列表中搜索任务，按相关度排序；用 nextCursor 获取下一页
+export const searchTasks = async (
+  userId: number,
+  query: string,
+  cursor?: string,
+): Promise<{ tasks: Task[]; nextCursor: string | null }> => {
+  try {
+    const response = await axios.get(`${API_BASE_URL}/search/${userId}`, {
+      params: cursor ? { q: query, cursor } : { q: query },
+    });
+    const foundTasks: RawTask[] = response.data.tasks;
+    return {
+      tasks: foundTasks.map((task) => ({ ...task, completed: task.progress === 'Completed' })),
+      nextCursor: response.data.next_cursor,
+    };
+  } catch (error) {
+    console.error('Error searching tasks:', error);
+    return { tasks: [], nextCursor: null };
+  }
+};
+
 export const addTaskToServer = async (payload: Omit<Task, 'id' | 'completed'>): Promise<Task | null> => {
   try {
     const response = await axios.post(`${API_BASE_URL}/tasks`, payload);
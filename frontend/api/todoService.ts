@@ -52,6 +52,19 @@ export const fetchTasks = async (todolistId: number) => {
     }
   };
 
+// **一次获取首页数据：列表、成员、任务统计，以及可选的某个列表的第一页任务**
+export const fetchHome = async (userId: number, todolistId?: number) => {
+  try {
+    const response = await axios.get(`${API_BASE_URL}/home/${userId}`, {
+      params: todolistId !== undefined ? { todolist_id: todolistId } : {},
+    });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching home data:', error);
+    return { todolists: [], tasks: null };
+  }
+};
+
   export const createTodoList = async (userId: number, shared: number, name: string) => {
     try {
       const response = await axios.post(`${API_BASE_URL}/todolists`, null, {